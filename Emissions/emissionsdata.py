@@ -2,37 +2,53 @@ import bokeh.plotting as bkh
 import bokeh.models as bkm
 import bokeh.layouts as bkl
 
+from instrumentation import instrumented, span
+
 import pandas as pd
 import datetime
 
+try:
+    from .uncertainty import MonteCarlo
+    from .countries import CountryEmissions
+    from .sectors import SectorEmissions, STATISTICS
+except ImportError:
+    from uncertainty import MonteCarlo
+    from countries import CountryEmissions
+    from sectors import SectorEmissions, STATISTICS
+
 class Emissions():
     
-    def __init__(self, country_co2='./Emissions/UK_CO2Emissions.csv', global_co2='./Emissions/GlobalDailyCO2.csv', sector_co2='./Emissions/globalemissions_sector.csv'):
-        df = pd.read_csv(country_co2, usecols=[2,4])
-        df['DATE'] = pd.to_datetime(df['DATE'], format='%d/%m/%Y')
-        df['United Kingdom'] = df['United Kingdom'].str.rstrip('%').astype('float')/100
-        self.country_co2 = df
+    @instrumented
+    def __init__(self, country_co2='./Emissions/CO2EmissionsByCountry.csv', global_co2='./Emissions/GlobalDailyCO2.csv', sector_co2='./Emissions/globalemissions_sector.csv'):
+        # Every country in the file, as a country x day matrix.
+        self.countries = CountryEmissions.from_csv(country_co2)
+        uk = self.countries.series('United Kingdom')
+        self.country_co2 = pd.DataFrame({'DATE': uk.index, 'United Kingdom': uk.values})
         
         self.global_co2 = pd.read_csv(global_co2, skiprows=4)
         
-        df = pd.read_csv(sector_co2, skiprows=4)[:163]
-        df['Date_'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-        self.sector_co2 = df
+        # Every sector's value and uncertainty band, as a date x sector x statistic cube.
+        self.sectors = SectorEmissions.from_csv(sector_co2)
         
-    def plot_uk_daily(self, figsize=(600,300), color='firebrick'):
+    @instrumented
+    def plot_uk_daily(self, figsize=(600,300), color='firebrick', show=True, country='United Kingdom', label='UK'):
         p = bkh.figure(x_axis_type='datetime', plot_width=figsize[0], plot_height=figsize[1])
         
-        p.line(x=self.country_co2['DATE'],
-               y=self.country_co2['United Kingdom'], color=color, legend_label='UK')
+        series = self.countries.series(country)
+        p.line(x=series.index, y=series.values, color=color, legend_label=label)
         
         p.yaxis.axis_label = 'CO₂ Emissions [MtCO₂ per day]'
         p.xaxis.axis_label = 'Date'
         
         p.xaxis[0].formatter = bkm.DatetimeTickFormatter(days=['%d/%m'])
 
-        bkh.show(p)
+        if not show:
+            return p
+        with span('bokeh.show'):
+            bkh.show(p)
         
-    def plot_global_daily(self, figsize=(600,300), colors=['royalblue', 'firebrick']):
+    @instrumented
+    def plot_global_daily(self, figsize=(600,300), colors=['royalblue', 'firebrick'], show=True):
         p = bkh.figure(plot_width=figsize[0], plot_height=figsize[1])
         
         p.line(x=self.global_co2['year'],
@@ -47,24 +63,24 @@ class Emissions():
         p.xaxis.axis_label = 'Year'
         p.legend.location = 'bottom_right'
 
-        bkh.show(p)
+        if not show:
+            return p
+        with span('bokeh.show'):
+            bkh.show(p)
         
-    def plot_sector(self, figsize=(400,300), colors=['royalblue', 'firebrick', 'darkgreen', 'gold', 'violet', 'gray']):
+    @instrumented
+    def plot_sector(self, figsize=(400,300), colors=['royalblue', 'firebrick', 'darkgreen', 'gold', 'violet', 'gray'], show=True):
         
-        sectors = ['Power', 'Industry', 'Transport', 'Public', 'Residential', 'Aviation']
-        suffs = ['', '.1', '.2', '.3', '.4', '.5']
+        dates = self.sectors.dates
+        value, low, high = [self.sectors.statistic(statistic) for statistic in STATISTICS]
         figures = []
         
-        for i, sector in enumerate(sectors):
+        for i, sector in enumerate(self.sectors.sectors):
             p = bkh.figure(x_axis_type='datetime', title=sector+' CO₂ Emissions', plot_width=figsize[0], plot_height=figsize[1])
         
-            p.line(x=self.sector_co2['Date_'],
-                   y=self.sector_co2[('value'+suffs[i])], color=colors[i])
+            p.line(x=dates, y=value[:, i], color=colors[i])
         
-            p.varea(x=self.sector_co2['Date_'],
-                    y1=self.sector_co2[('low uncertainty'+suffs[i])],
-                    y2=self.sector_co2[('high uncertainty'+suffs[i])],
-                    alpha=0.2, color=colors[i])
+            p.varea(x=dates, y1=low[:, i], y2=high[:, i], alpha=0.2, color=colors[i])
 
             p.yaxis.axis_label = 'Decrease in CO₂ Emissions [%]'
             p.xaxis.axis_label = 'Year'
@@ -72,4 +88,25 @@ class Emissions():
             figures.append(p)
 
         layout = bkl.layout([figures[:3], figures[3:]])
-        bkh.show(layout)
+        if not show:
+            return layout
+        with span('bokeh.show'):
+            bkh.show(layout)
+
+    def sector_uncertainty(self, z=1.0, time_correlation=1.0, series_correlation=0.0):
+        """Monte Carlo sampler over the daily sector changes and their uncertainty bands."""
+        value, low, high = [self.sectors.statistic(statistic) for statistic in STATISTICS]
+        return MonteCarlo(self.sectors.dates, self.sectors.sectors, value, low, high, z=z, time_correlation=time_correlation, series_correlation=series_correlation)
+
+    def sector_reductions(self, windows=None, annualise=False, sampler=None, **kwargs):
+        """
+        Quantiles of the cumulative (or annualised) change in emissions [MtCO₂] for
+        each sector and date window, e.g. windows={'lockdown': ('2020-03-23', '2020-05-13')}.
+
+        Further arguments (n_samples, seed, chunk_size, executor, quantiles) are
+        passed to MonteCarlo.quantiles.
+        """
+        sampler = sampler or self.sector_uncertainty()
+        if windows is None:
+            windows = {'2020': (sampler.dates[0], sampler.dates[-1])}
+        return sampler.quantiles(windows, annualise=annualise, **kwargs)
@@ -0,0 +1,117 @@
+"""
+Daily change in global fossil CO2 emissions by sector, as one date x sector x statistic cube.
+
+    sectors = SectorEmissions.from_csv('./Emissions/globalemissions_sector.csv')
+    sectors.series('Power')                              # the daily values, a view on the cube
+    sectors.total()                                      # summed over sectors, with the bands
+    sectors.window_mean('2020-03-23', '2020-05-13')      # sectors x statistics
+
+Values are in MtCO2 per day. The statistics are the central value and the low
+and high ends of the uncertainty band, in STATISTICS order.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .countries import find_header
+except ImportError:
+    from countries import find_header
+
+from instrumentation import instrumented, span
+
+STATISTICS = ['value', 'low', 'high']
+
+# Column names of each statistic in the file's second header row.
+FILE_STATISTICS = {'value': 'value', 'low': 'low uncertainty', 'high': 'high uncertainty'}
+
+
+class SectorEmissions:
+    """
+    `values` is a float64 (dates, sectors, statistics) array, `dates` a datetime64[D]
+    array and `sectors` a pandas Index.
+    """
+    def __init__(self, values, sectors, dates):
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.sectors = pd.Index(sectors)
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+
+    @classmethod
+    @instrumented
+    def from_csv(cls, data_file):
+        """
+        Parse a globalemissions_sector.csv-style file: a preamble, a row of sector
+        names each spanning its statistic columns, then a row with year, Julian
+        doy, date and the statistic of every column. Rows without a date (the
+        blank rows after the data) are dropped.
+        """
+        with open(data_file) as f:
+            lines = f.read().splitlines()
+        header = find_header(lines, 'date')
+
+        names = [field.strip() for field in lines[header].split(',')]
+        date = names.index('date')
+        first = date + 1
+        spans = pd.Series([field.strip() or None for field in lines[header - 1].split(',')][first:len(names)]).ffill()
+        sectors = list(dict.fromkeys(spans.dropna()))
+
+        # Column of each (sector, statistic) among the value columns.
+        position = {(sector, name): i for i, (sector, name) in enumerate(zip(spans, names[first:]))}
+        columns = np.array([[position[(sector, FILE_STATISTICS[statistic])] for statistic in STATISTICS]
+                            for sector in sectors])
+
+        with span('read_csv'):
+            # The statistic names repeat for every sector, so columns are read by position.
+            table = pd.read_csv(io.StringIO('\n'.join(lines[header + 1:])), header=None,
+                                dtype={date: str}).dropna(subset=[date])
+
+        dates = pd.to_datetime(table[date], format='%d/%m/%Y').values.astype('datetime64[D]')
+        values = table.iloc[:, first:].values.astype(np.float64)
+        return cls(values[:, columns], sectors, dates)
+
+    def column(self, sector):
+        return self.sectors.get_loc(sector)
+
+    def statistic(self, statistic='value'):
+        """(dates, sectors) view of one statistic."""
+        return self.values[:, :, STATISTICS.index(statistic)]
+
+    def series(self, sector, statistic='value'):
+        """One sector's daily statistic, as a Series (a view on the cube)."""
+        return pd.Series(self.values[:, self.column(sector), STATISTICS.index(statistic)],
+                         index=pd.DatetimeIndex(self.dates), name=sector)
+
+    def _rows(self, start, end):
+        first = np.searchsorted(self.dates, np.datetime64(start, 'D')) if start is not None else 0
+        last = np.searchsorted(self.dates, np.datetime64(end, 'D'), 'right') if end is not None else len(self.dates)
+        return slice(first, last)
+
+    def select(self, sectors=None, start=None, end=None):
+        """A SectorEmissions restricted to some sectors and/or an inclusive date range."""
+        rows = self._rows(start, end)
+        if sectors is None:
+            return SectorEmissions(self.values[rows], self.sectors, self.dates[rows])
+        columns = self.sectors.get_indexer(sectors)
+        if (columns < 0).any():
+            raise KeyError('Unknown sectors: {}'.format([s for s, c in zip(sectors, columns) if c < 0]))
+        return SectorEmissions(self.values[rows][:, columns], self.sectors[columns], self.dates[rows])
+
+    def total(self):
+        """
+        (dates, statistics) DataFrame of the sum over sectors. Summing the band ends
+        treats the sector errors as fully correlated; see MonteCarlo otherwise.
+        """
+        return pd.DataFrame(self.values.sum(axis=1), index=pd.DatetimeIndex(self.dates, name='date'),
+                            columns=STATISTICS)
+
+    def window_mean(self, start=None, end=None):
+        """(sectors, statistics) DataFrame of the mean over an inclusive date window."""
+        return pd.DataFrame(np.nanmean(self.values[self._rows(start, end)], axis=0), index=self.sectors,
+                            columns=STATISTICS)
+
+    def to_frame(self):
+        """(dates, sector x statistic) DataFrame of the cube."""
+        columns = pd.MultiIndex.from_product([self.sectors, STATISTICS], names=['sector', 'statistic'])
+        return pd.DataFrame(self.values.reshape(len(self.dates), -1), index=pd.DatetimeIndex(self.dates, name='date'),
+                            columns=columns)
@@ -0,0 +1,106 @@
+"""
+Monte Carlo propagation of the daily sector emission uncertainties.
+
+The sector estimates come with asymmetric (low, high) uncertainty bands for every
+day. Errors on one day are not independent of errors on the next (they come
+from the same confinement-level assumptions), so summing the bands over a window
+needs samples: each draw is a correlated path through all days and sectors,
+which is integrated over the requested date windows.
+"""
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented, span
+
+
+class MonteCarlo:
+    """
+    Sampler for daily series with asymmetric uncertainty bands.
+
+    `value`, `low` and `high` are (days, series) arrays; missing values count as no
+    change. The bands are taken as `z` standard deviations either side of the value
+    (a split normal). `time_correlation` is the day-to-day (AR(1)) correlation of
+    the errors, with 1 meaning a fully systematic error, and `series_correlation`
+    is the correlation between series on the same day.
+    """
+    def __init__(self, dates, names, value, low, high, z=1.0, time_correlation=1.0, series_correlation=0.0):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.names = list(names)
+
+        value, low, high = [np.nan_to_num(np.asarray(a, dtype=np.float64)) for a in (value, low, high)]
+        self.value = value
+        self.sigma_low = (value - np.minimum(low, high))/z
+        self.sigma_high = (np.maximum(low, high) - value)/z
+
+        self.time_correlation = time_correlation
+        n = len(self.names)
+        correlation = (1 - series_correlation)*np.eye(n) + series_correlation*np.ones((n, n))
+        self.cholesky = np.linalg.cholesky(correlation)
+
+    def draw(self, n_samples, rng):
+        """Return an (n_samples, days, series) array of sampled daily values."""
+        days, series = self.value.shape
+
+        if self.time_correlation >= 1:
+            z = (rng.standard_normal((n_samples, 1, series)) @ self.cholesky.T)
+        else:
+            eps = rng.standard_normal((n_samples, days, series)) @ self.cholesky.T
+            rho = self.time_correlation
+            z = np.empty_like(eps)
+            z[:, 0] = eps[:, 0]
+            for day in range(1, days):
+                z[:, day] = rho*z[:, day-1] + np.sqrt(1 - rho**2)*eps[:, day]
+
+        return self.value + np.where(z > 0, z*self.sigma_high, z*self.sigma_low)
+
+    def window_weights(self, windows):
+        # (windows, days) indicator matrix, so integration is a single contraction.
+        weights = np.zeros((len(windows), len(self.dates)))
+        for i, (start, end) in enumerate(windows.values()):
+            weights[i] = (self.dates >= np.datetime64(start, 'D')) & (self.dates <= np.datetime64(end, 'D'))
+        return weights
+
+    def _integrate_chunk(self, seed, n_samples, weights):
+        rng = np.random.default_rng(seed)
+        return np.einsum('nds,wd->nws', self.draw(n_samples, rng), weights)
+
+    @instrumented
+    def integrate(self, windows, n_samples=100000, chunk_size=2000, seed=None, executor=None):
+        """
+        Sample totals over each date window, as an (n_samples, windows, series) array.
+
+        Samples are drawn in chunks of `chunk_size` so memory stays bounded whatever
+        `n_samples` is. Every chunk has its own stream spawned from `seed`, so the
+        result is reproducible, and chunks can be mapped over an `executor`.
+        """
+        weights = self.window_weights(windows)
+        sizes = [min(chunk_size, n_samples - start) for start in range(0, n_samples, chunk_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+        map_ = executor.map if executor is not None else map
+        with span('monte_carlo.sample'):
+            chunks = list(map_(self._integrate_chunk, seeds, sizes, [weights]*len(sizes)))
+        return np.concatenate(chunks)
+
+    def quantiles(self, windows, quantiles=(0.025, 0.5, 0.975), annualise=False, total=True, **kwargs):
+        """
+        Quantiles of the cumulative (or annualised) change over each window.
+
+        `windows` maps a name to a (start, end) pair of dates, inclusive. Annualised
+        values are the window's mean daily change scaled to 365 days. With `total`
+        the sum over all series is included as 'Total'.
+        """
+        totals = self.integrate(windows, **kwargs)
+        names = list(self.names)
+        if total:
+            totals = np.concatenate([totals, totals.sum(axis=2, keepdims=True)], axis=2)
+            names.append('Total')
+        if annualise:
+            days = self.window_weights(windows).sum(axis=1)
+            totals = totals*(365/days)[None, :, None]
+
+        index = pd.MultiIndex.from_product([list(windows), names], names=['window', 'sector'])
+        table = pd.DataFrame(np.quantile(totals, quantiles, axis=0).reshape(len(quantiles), -1).T,
+                             index=index, columns=list(quantiles))
+        table.insert(0, 'mean', totals.mean(axis=0).reshape(-1))
+        return table
@@ -0,0 +1,254 @@
+"""
+Small asyncio HTTP service for the prepared lockdown series.
+
+    python api.py --port 8000
+
+Every dataset is built once at start-up and served from memory:
+
+    GET /                                    index of series, their columns and date ranges
+    GET /<dataset>/<series>?start=2020-03-01&end=2020-05-31&format=json|npy|arrow
+
+Responses carry an ETag (a different one for the gzipped body) and honour
+If-None-Match, and are gzipped when the client accepts it. Encoded responses are cached, so repeated requests cost a
+dictionary lookup.
+"""
+import io
+import json
+import gzip
+import asyncio
+import hashlib
+import logging
+import argparse
+import collections
+import urllib.parse
+from email.utils import formatdate
+
+import numpy as np
+import pandas as pd
+
+from loaders import load_all, ROOT
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {'json': 'application/json',
+                 'npy': 'application/octet-stream',
+                 'arrow': 'application/vnd.apache.arrow.stream'}
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 406: 'Not Acceptable'}
+
+
+def build_series(datasets, model_output=None):
+    """
+    Plot-ready tables from each loaded dataset, keyed by '<dataset>/<series>'.
+
+    Date-indexed tables have a sorted 'date' column, used by the range filters.
+    Datasets that fail to load are left out.
+    """
+    series = {}
+
+    def add(name, build):
+        try:
+            table = build()
+        except Exception as error:
+            logger.warning('Skipping %s: %r', name, error)
+            return
+        if 'date' in table:
+            table = table.sort_values('date').reset_index(drop=True)
+        series[name] = table
+
+    def grid_discrepancy():
+        grid = datasets['grid'].result()
+        grid.load_model_output(model_output)
+        return pd.DataFrame({'date': grid.covid_dates, 'mean': grid.discrepancy_mean,
+                             'low': grid.discrepancy_low, 'high': grid.discrepancy_high})
+
+    def octopus_daily():
+        average = datasets['octopus'].result().get_data_average()
+        columns = [c for c in ['electricity_daily_total', 'gas_daily_total', 'temperature'] if c in average]
+        return average[columns].assign(date=pd.to_datetime(average.Date_))
+
+    def traffic_effects(immediate):
+        traffic = datasets['traffic'].result()
+        vehicles = list(traffic.vehicle_types)
+        effects = traffic.estimate_effects(immediate=immediate, vehicle_types=vehicles)
+        return effects.astype(float).assign(vehicle=vehicles)
+
+    def traffic_daily():
+        traffic = datasets['traffic'].result()
+        return traffic.transport[['Date'] + list(traffic.vehicle_types)].rename(columns={'Date': 'date'})
+
+    def emissions_sector():
+        table = datasets['emissions'].result().sectors.to_frame()
+        table.columns = ['{} {}'.format(sector, statistic) for sector, statistic in table.columns]
+        return table.reset_index()
+
+    def emissions_global():
+        global_co2 = datasets['emissions'].result().global_co2.dropna(subset=['date'])
+        return global_co2[['value', 'low uncertainty', 'high uncertainty']].assign(
+            date=pd.to_datetime(global_co2.date, format='%d/%m/%Y'))
+
+    grid = lambda: datasets['grid'].result()
+    add('grid/daily', lambda: pd.DataFrame({'date': grid().dates, 'demand_mw': grid().demand}))
+    if model_output:
+        add('grid/discrepancy', grid_discrepancy)
+    add('octopus/daily', octopus_daily)
+    add('traffic/daily', traffic_daily)
+    add('traffic/immediate_effects', lambda: traffic_effects(True))
+    add('traffic/daily_effects', lambda: traffic_effects(False))
+    add('emissions/uk', lambda: datasets['emissions'].result().country_co2.rename(columns={'DATE': 'date'}))
+    add('emissions/sector', emissions_sector)
+    add('emissions/global', emissions_global)
+    add('covid/cases', lambda: datasets['corona'].result().get_cases().rename(columns={'Date': 'date'}))
+    add('covid/deaths', lambda: datasets['corona'].result().get_deaths().rename(columns={'Date': 'date'}))
+    return series
+
+
+def encode(table, fmt):
+    if fmt == 'json':
+        return table.to_json(orient='split', index=False, date_format='iso').encode()
+
+    if fmt == 'npy':
+        # np.save can't write object arrays without pickle, so store text as fixed-width unicode.
+        records = table.to_records(index=False)
+        dtype = [(name, 'U{}'.format(max(1, table[name].astype(str).str.len().max())) if records.dtype[name] == object else records.dtype[name])
+                 for name in records.dtype.names]
+        buffer = io.BytesIO()
+        np.save(buffer, records.astype(dtype), allow_pickle=False)
+        return buffer.getvalue()
+
+    import pyarrow as pa
+    batch = pa.RecordBatch.from_pandas(table, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+class SeriesServer:
+    def __init__(self, series, cache_size=512):
+        self.series = series
+        self.cache = collections.OrderedDict()
+        self.cache_size = cache_size
+        self.index = json.dumps({name: {'columns': list(table.columns),
+                                        'start': str(table.date.iloc[0].date()) if 'date' in table and len(table) else None,
+                                        'end': str(table.date.iloc[-1].date()) if 'date' in table and len(table) else None,
+                                        'rows': len(table)}
+                                 for name, table in series.items()}, indent=1).encode()
+
+    def select(self, name, start, end):
+        table = self.series[name]
+        if 'date' not in table or (start is None and end is None):
+            return table
+        dates = table.date.values
+        first = np.searchsorted(dates, np.datetime64(start), 'left') if start else 0
+        last = np.searchsorted(dates, np.datetime64(end) + np.timedelta64(1, 'D'), 'left') if end else len(dates)
+        return table.iloc[first:last]
+
+    def response(self, name, start, end, fmt):
+        """
+        Encoded body and its gzipped form, each with its own ETag, built once per
+        distinct request.
+        """
+        key = (name, start, end, fmt)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        body = self.index if name == '' else encode(self.select(name, start, end), fmt)
+        digest = hashlib.sha1(body).hexdigest()
+        entry = (body, '"{}"'.format(digest), gzip.compress(body), '"{}-gzip"'.format(digest))
+        self.cache[key] = entry
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return entry
+
+    def route(self, method, target, headers):
+        if method not in ('GET', 'HEAD'):
+            return 405, {}, b''
+
+        url = urllib.parse.urlsplit(target)
+        name = url.path.strip('/')
+        query = dict(urllib.parse.parse_qsl(url.query))
+        fmt = query.get('format', 'json')
+
+        if name and name not in self.series:
+            return 404, {}, b'Unknown series\n'
+        if fmt not in CONTENT_TYPES:
+            return 400, {}, b'Unknown format\n'
+        try:
+            body, etag, gzipped, gzip_etag = self.response(name, query.get('start'), query.get('end'),
+                                                           fmt if name else 'json')
+        except ImportError:
+            # pyarrow missing, or installed but broken.
+            return 406, {}, b'Arrow output needs a working pyarrow\n'
+        except ValueError:
+            return 400, {}, b'Bad date filter\n'
+
+        response_headers = {'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding',
+                            'Content-Type': CONTENT_TYPES[fmt if name else 'json']}
+        if 'gzip' in headers.get('accept-encoding', ''):
+            response_headers['Content-Encoding'] = 'gzip'
+            body, etag = gzipped, gzip_etag
+        response_headers['ETag'] = etag
+        if etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            return 304, response_headers, b''
+        return 200, response_headers, body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    field, _, value = line.decode('latin-1').partition(':')
+                    headers[field.strip().lower()] = value.strip()
+
+                status, response_headers, body = self.route(method, target, headers)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+                head = ['HTTP/1.1 {} {}'.format(status, REASONS[status]),
+                        'Date: {}'.format(formatdate(usegmt=True)),
+                        'Content-Length: {}'.format(len(body)),
+                        'Connection: {}'.format('keep-alive' if keep_alive else 'close')]
+                head += ['{}: {}'.format(field, value) for field, value in response_headers.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+                if method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        server = await asyncio.start_server(self.handle, host, port)
+        print('Serving {} series on http://{}:{}/'.format(len(self.series), host, port))
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the prepared lockdown series over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--root', default=ROOT, help='repository root holding the data files')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+
+    series = build_series(load_all(args.root), model_output='{}/grid/model_output.p'.format(args.root))
+    asyncio.run(SeriesServer(series).serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Run the benchmark suite without asv.
+
+    python -m benchmarks [--scale 1 10] [--match grid] [--repeat 3] [--output results.json]
+
+Each `time_*` method is reported as the best of `--repeat` runs, and each
+`peakmem_*` method as the peak memory allocated by Python (via tracemalloc).
+A benchmark (or suite setup) that raises is reported and recorded with its
+error, and the rest of the suite still runs; the exit status is then 1.
+"""
+import argparse
+import inspect
+import sys
+import json
+import time
+import tracemalloc
+
+from benchmarks import benchmarks
+
+
+def suites():
+    for name, cls in inspect.getmembers(benchmarks, inspect.isclass):
+        if name.endswith('Suite') and cls.__module__ == benchmarks.__name__:
+            yield name, cls
+
+
+def measure(method, args, kind, repeat):
+    if kind == 'time':
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            method(*args)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    tracemalloc.start()
+    try:
+        method(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, nargs='+', default=benchmarks.SCALES)
+    parser.add_argument('--match', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    for suite_name, cls in suites():
+        parameterised = hasattr(cls, 'params')
+        for scale in (args.scale if parameterised else [1]):
+            methods = [m for m in dir(cls) if m.startswith(('time_', 'peakmem_'))
+                       and args.match in '{}.{}'.format(suite_name, m)]
+            if not methods:
+                continue
+
+            suite = cls()
+            params = (scale,) if parameterised else ()
+            try:
+                suite.setup(*params)
+            except Exception as error:
+                setup_error = error
+            else:
+                setup_error = None
+
+            for method_name in methods:
+                kind = method_name.split('_')[0]
+                result = {'benchmark': '{}.{}'.format(suite_name, method_name), 'scale': scale, 'kind': kind}
+                try:
+                    if setup_error is not None:
+                        raise setup_error
+                    value = measure(getattr(suite, method_name), params, kind, args.repeat)
+                except Exception as error:
+                    results.append({**result, 'value': None, 'error': repr(error)})
+                    print('{:50s} x{:<4d} failed: {!r}'.format(result['benchmark'], scale, error), flush=True)
+                    continue
+
+                results.append({**result, 'value': value})
+                unit = '{:10.3f} s'.format(value) if kind == 'time' else '{:10.1f} MB'.format(value/2**20)
+                print('{:50s} x{:<4d} {}'.format(result['benchmark'], scale, unit), flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if any('error' in result for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmarks for the data loaders, models and plot preparation.
+
+The classes follow asv conventions: `time_*` methods are timed, `peakmem_*` methods
+have their peak memory recorded, and `params` gives the dataset scales (multiples
+of the shipped file sizes). Run them with `python -m benchmarks`.
+"""
+import os
+import sys
+import tempfile
+import contextlib
+
+import matplotlib
+matplotlib.use('Agg')
+
+import bokeh.plotting as bkh
+import matplotlib.pyplot as plt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import synthetic
+
+from grid import griddata_core, griddata_bkh, griddata_mpl, octopusdata
+from transport.Transport import Traffic
+from Emissions import emissionsdata
+
+SCALES = [1, 10, 100]
+DATA_DIRECTORY = os.path.join(tempfile.gettempdir(), 'coronasaurus-benchmarks')
+
+
+def dataset(scale):
+    # Generating the 100x files takes a while, so they are written once and reused.
+    directory = os.path.join(DATA_DIRECTORY, 'x{}'.format(scale))
+    files = {name: os.path.join(directory, name + '.csv')
+             for name in ['demand', 'octopus', 'octopus_weather', 'transport', 'transport_weather']}
+    if not all(os.path.exists(f) for f in files.values()):
+        files = synthetic.generate(directory, scale)
+    return files
+
+
+@contextlib.contextmanager
+def no_show():
+    # Build the figures without opening a browser tab or a window.
+    show = bkh.show
+    bkh.show = lambda *args, **kwargs: None
+    try:
+        yield
+    finally:
+        bkh.show = show
+        plt.close('all')
+
+
+class GridDataSuite:
+    params = SCALES
+    param_names = ['scale']
+    timeout = 600
+
+    def setup(self, scale):
+        self.files = dataset(scale)
+        self.grid_data = griddata_bkh.GridData(self.files['demand'])
+        self.grid_data_mpl = griddata_mpl.GridData(self.files['demand'])
+
+    # The front-ends share a cached core, so time the parse and aggregation directly.
+    def time_init(self, scale):
+        griddata_core.GridDataCore(self.files['demand'])
+
+    def peakmem_init(self, scale):
+        griddata_core.GridDataCore(self.files['demand'])
+
+    def time_plot_demand_bkh(self, scale):
+        with no_show():
+            self.grid_data.plot_demand_bkh(collapse=True)
+            self.grid_data.plot_demand_bkh(collapse=False)
+
+    def time_plot_demand_mpl(self, scale):
+        with no_show():
+            self.grid_data_mpl.plot_demand(collapse=True)
+            self.grid_data_mpl.plot_demand(collapse=False)
+
+
+class OctopusDataSuite:
+    params = SCALES
+    param_names = ['scale']
+    timeout = 600
+
+    def setup(self, scale):
+        self.files = dataset(scale)
+        self.octopus = octopusdata.OctopusData(self.files['octopus'], self.files['octopus_weather'])
+
+    def time_init(self, scale):
+        octopusdata.OctopusData(self.files['octopus'], self.files['octopus_weather'])
+
+    def peakmem_init(self, scale):
+        octopusdata.OctopusData(self.files['octopus'], self.files['octopus_weather'])
+
+    def time_plot_timeline_bkh(self, scale):
+        with no_show():
+            self.octopus.plot_timeline_bkh()
+
+    def time_plot_daily_bkh(self, scale):
+        with no_show():
+            self.octopus.plot_daily_electricity_bkh(plot_temperature=True)
+            self.octopus.plot_daily_gas_bkh(plot_temperature=True)
+
+
+class TrafficSuite:
+    params = SCALES
+    param_names = ['scale']
+    timeout = 1800
+
+    vehicle_types = ['Cars', 'LCV', 'HGV', 'National_rail', 'Tube_London', 'Bus_Others']
+
+    def setup(self, scale):
+        self.files = dataset(scale)
+        self.traffic = Traffic(self.files['transport'], self.files['transport_weather'])
+
+    def time_init(self, scale):
+        Traffic(self.files['transport'], self.files['transport_weather'])
+
+    # Fitted models are cached in the results store, so start each fit from an empty one.
+    def time_estimate_effects(self, scale):
+        self.traffic.set_results_store()
+        with no_show():
+            self.traffic.estimate_effects(immediate=False, vehicle_types=self.vehicle_types)
+
+    def peakmem_estimate_effects(self, scale):
+        self.traffic.set_results_store()
+        with no_show():
+            self.traffic.estimate_effects(immediate=False, vehicle_types=self.vehicle_types)
+
+    def time_estimate_effects_cached(self, scale):
+        with no_show():
+            self.traffic.estimate_effects(immediate=False, vehicle_types=self.vehicle_types)
+
+    def time_run_interrupted_LM(self, scale):
+        self.traffic.set_results_store()
+        with no_show():
+            self.traffic.run_interrupted_LM(self.vehicle_types)
+
+    def time_run_mixed_LM_for_bikes(self, scale):
+        with no_show():
+            self.traffic.run_mixed_LM_for_bikes()
+
+    def peakmem_run_mixed_LM_for_bikes(self, scale):
+        with no_show():
+            self.traffic.run_mixed_LM_for_bikes()
+
+    def time_plot_CO2_emissions(self, scale):
+        with no_show():
+            self.traffic.plot_CO2_emissions()
+
+
+class EmissionsSuite:
+    # The emissions files are only benchmarked at their shipped size.
+
+    def setup(self):
+        self.files = dict(country_co2=os.path.join(ROOT, 'Emissions', 'CO2EmissionsByCountry.csv'),
+                          global_co2=os.path.join(ROOT, 'Emissions', 'GlobalDailyCO2.csv'),
+                          sector_co2=os.path.join(ROOT, 'Emissions', 'globalemissions_sector.csv'))
+        self.emissions = emissionsdata.Emissions(**self.files)
+
+    def time_init(self):
+        emissionsdata.Emissions(**self.files)
+
+    def peakmem_init(self):
+        emissionsdata.Emissions(**self.files)
+
+    def time_plot_sector(self):
+        with no_show():
+            self.emissions.plot_sector()
+
+    def time_plot_daily(self):
+        with no_show():
+            self.emissions.plot_uk_daily()
+            self.emissions.plot_global_daily()
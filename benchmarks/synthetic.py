@@ -0,0 +1,144 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from calendar_table import calendar
+
+# Sizes of the files shipped with the repository, used as the 1x reference.
+DEMAND_DAYS = 1923
+OCTOPUS_PERIODS = 2354
+TRANSPORT_DAYS = 100
+
+DEMAND_COLUMNS = ['SETTLEMENT_DATE', 'SETTLEMENT_PERIOD', 'ND', 'I014_ND', 'TSD', 'I014_TSD',
+                  'ENGLAND_WALES_DEMAND', 'EMBEDDED_WIND_GENERATION', 'EMBEDDED_WIND_CAPACITY',
+                  'EMBEDDED_SOLAR_GENERATION', 'EMBEDDED_SOLAR_CAPACITY', 'NON_BM_STOR',
+                  'PUMP_STORAGE_PUMPING', 'I014_PUMP_STORAGE_PUMPING', 'FRENCH_FLOW', 'BRITNED_FLOW',
+                  'MOYLE_FLOW', 'EAST_WEST_FLOW', 'NEMO_FLOW', 'I014_FRENCH_FLOW', 'I014_BRITNED_FLOW',
+                  'I014_MOYLE_FLOW', 'I014_EAST_WEST_FLOW']
+
+VEHICLE_TYPES = ['Cars', 'LCV', 'HGV', 'All_motor', 'National_rail', 'Tube_London', 'Bus_London',
+                 'Bus_Others', 'Cycling']
+
+
+def demand_data(file_name, scale=1, start='2015-01-01', seed=0):
+    """
+    Write a DemandData-style file with `scale` stacked blocks of DEMAND_DAYS days each.
+
+    Every block covers the same calendar (like a regional file with one block per
+    region), so the dates stay within the range pandas can represent at any scale.
+    """
+    rng = np.random.default_rng(seed)
+    dates = np.arange(np.datetime64(start), np.datetime64(start) + DEMAND_DAYS)
+    table = calendar(dates)
+    periods_per_day = table.settlement_periods[table.rows(dates)].astype(np.int64)
+    day = np.repeat(dates, periods_per_day)
+    period = np.concatenate([np.arange(1, n + 1) for n in periods_per_day])
+    labels = pd.DatetimeIndex(day).strftime('%d-%b-%Y').str.upper().values
+
+    # Seasonal and daily demand cycles, in MW.
+    doy = pd.DatetimeIndex(day).dayofyear.values
+    base = 28000 + 6000*np.cos(2*np.pi*doy/365.25) + 4000*np.sin(np.pi*(period - 12)/24)
+
+    with open(file_name, 'w') as f:
+        f.write(','.join(DEMAND_COLUMNS) + '\n')
+
+    for block in range(int(scale)):
+        nd = (base + rng.normal(0, 800, len(base))).astype(int)
+        flows = rng.integers(-1000, 2000, size=(len(base), 9))
+        frame = pd.DataFrame({
+            'SETTLEMENT_DATE': labels,
+            'SETTLEMENT_PERIOD': period,
+            'ND': nd,
+            'I014_ND': nd - 2500,
+            'TSD': nd + 700,
+            'I014_TSD': nd - 1900,
+            'ENGLAND_WALES_DEMAND': (0.9*nd).astype(int),
+            'EMBEDDED_WIND_GENERATION': rng.integers(0, 4000, len(base)),
+            'EMBEDDED_WIND_CAPACITY': 6500,
+            'EMBEDDED_SOLAR_GENERATION': np.clip(8000*np.sin(np.pi*(period - 12)/24), 0, None).astype(int),
+            'EMBEDDED_SOLAR_CAPACITY': 13080,
+            'NON_BM_STOR': 0,
+            'PUMP_STORAGE_PUMPING': rng.integers(0, 500, len(base)),
+            'I014_PUMP_STORAGE_PUMPING': rng.integers(0, 500, len(base)),
+        })
+        for i, column in enumerate(DEMAND_COLUMNS[14:]):
+            frame[column] = flows[:, i]
+        frame.to_csv(file_name, mode='a', header=False, index=False)
+
+    return file_name
+
+
+def octopus_data(file_name, scale=1, start='2020-03-09', seed=0):
+    """Write an octopus.csv-style half-hourly electricity and gas file."""
+    rng = np.random.default_rng(seed)
+    n = int(OCTOPUS_PERIODS*scale)
+    dates = pd.date_range(start, periods=n, freq='30min')
+    hour = dates.hour.values + dates.minute.values/60
+
+    frame = pd.DataFrame({
+        'Date': dates.strftime('%Y-%m-%d %H:%M:%S'),
+        'Electricity': 0.25 + 0.1*np.sin(np.pi*(hour - 6)/12) + rng.normal(0, 0.02, n),
+        'Gas (corrected)': 0.6 + 0.4*np.cos(np.pi*hour/12) + rng.normal(0, 0.05, n),
+    })
+    frame.to_csv(file_name, index=False)
+    return file_name
+
+
+def transport_data(file_name, scale=1, start='2020-03-01', seed=0):
+    """Write a UK_transport.csv-style daily relative traffic file."""
+    rng = np.random.default_rng(seed)
+    n = int(TRANSPORT_DAYS*scale)
+    dates = pd.date_range(start, periods=n, freq='D')
+    drop = np.where(dates > pd.Timestamp('2020-03-23'), 0.5, 1.0)
+
+    frame = pd.DataFrame({'Date': dates.strftime('%d/%m/%Y')})
+    for vehicle in VEHICLE_TYPES:
+        frame[vehicle] = np.round(drop*(1 + rng.normal(0, 0.05, n)), 2)
+
+    # The shipped file starts the cycling and bus series late, by 8 and 9 days.
+    frame.loc[:7, 'Cycling'] = np.nan
+    frame.loc[:8, 'Bus_Others'] = np.nan
+    frame.to_csv(file_name, index=False, na_rep='NA')
+    return file_name
+
+
+def weather_data(file_name, scale=1, start='2020-03-01', days=TRANSPORT_DAYS, seed=0, octopus=False):
+    """
+    Write a UK_weather.csv-style daily weather file.
+
+    The transport and Octopus copies of this file differ only in the names of the
+    monthly average columns, selected with `octopus`.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(days*scale)
+    dates = pd.date_range(start, periods=n, freq='D')
+    average = 10 + 7*np.sin(2*np.pi*(dates.dayofyear.values - 110)/365.25)
+
+    frame = pd.DataFrame({
+        'date': dates.strftime('%d/%m/%Y'),
+        'temperature': np.round(average + rng.normal(0, 3, n)).astype(int),
+        'rain': rng.integers(0, 2, n),
+    })
+    if octopus:
+        frame['avg_monthly_temperature'] = np.round(average, 1)
+    else:
+        frame['avg_monthly_temperature_2014_2019'] = np.round(average - 0.5, 1)
+        frame['avg_monthly_temperature_2020'] = np.round(average, 1)
+    frame.to_csv(file_name, index=False)
+    return file_name
+
+
+def generate(directory, scale=1):
+    """Write every synthetic dataset at the given scale into `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    path = lambda name: os.path.join(directory, name)
+
+    return {
+        'demand': demand_data(path('demand.csv'), scale),
+        'octopus': octopus_data(path('octopus.csv'), scale),
+        'octopus_weather': weather_data(path('octopus_weather.csv'), scale, start='2020-03-09',
+                                        days=OCTOPUS_PERIODS//48 + 1, octopus=True),
+        'transport': transport_data(path('transport.csv'), scale),
+        'transport_weather': weather_data(path('transport_weather.csv'), scale),
+    }
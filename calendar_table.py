@@ -0,0 +1,204 @@
+"""
+Precomputed calendar features shared by the grid, transport and counterfactual models.
+
+    table = calendar(dates)          # the shared table, extended to cover `dates` if needed
+    rows = table.rows(dates)         # vectorised date -> row lookup
+    table.weekday[rows], table.bank_holiday[rows], table.settlement_periods[rows]
+    settlement_timestamps(dates, periods)   # UTC start of DemandData settlement periods
+
+Every feature is a flat numpy array with one entry per day, so looking up the
+features of a column of dates is a subtraction and an index rather than string
+or per-row datetime work.
+"""
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# One-off bank holidays in England and Wales, and the regular ones they replaced.
+SPECIAL_HOLIDAYS = ['2011-04-29', '2012-06-05', '2022-06-03', '2022-09-19', '2023-05-08']
+MOVED_HOLIDAYS = {'2012-05-28': '2012-06-04', '2020-05-04': '2020-05-08', '2022-05-30': '2022-06-02'}
+
+
+def easter_sunday(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    g = (8*b + 13) // 25
+    h = (19*a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2*e + 2*i - h - k) % 7
+    m = (a + 11*h + 22*l) // 451
+    month, day = divmod(h + l - 7*m + 114, 31)
+    return np.datetime64('{:04d}-{:02d}-{:02d}'.format(year, month, day + 1), 'D')
+
+
+def _weekday(dates):
+    # 1970-01-01 was a Thursday.
+    return (np.asarray(dates, dtype='datetime64[D]').astype(np.int64) + 3) % 7
+
+
+def _last_weekday(year, month, weekday):
+    end = np.datetime64('{:04d}-{:02d}'.format(year, month), 'M') + 1
+    last = end.astype('datetime64[D]') - 1
+    return last - (_weekday(last) - weekday) % 7
+
+
+def _first_weekday(year, month, weekday):
+    first = np.datetime64('{:04d}-{:02d}-01'.format(year, month), 'D')
+    return first + (weekday - _weekday(first)) % 7
+
+
+def bank_holidays(years):
+    """England and Wales bank holidays in the given years, including substitute days."""
+    holidays = []
+    for year in years:
+        new_year = np.datetime64('{:04d}-01-01'.format(year), 'D')
+        holidays.append(new_year + {5: 2, 6: 1}.get(int(_weekday(new_year)), 0))
+
+        easter = easter_sunday(year)
+        holidays += [easter - 2, easter + 1]
+
+        holidays += [_first_weekday(year, 5, 0), _last_weekday(year, 5, 0), _last_weekday(year, 8, 0)]
+
+        # Christmas and Boxing Day falling on a weekend move to the next weekdays.
+        christmas = np.datetime64('{:04d}-12-25'.format(year), 'D')
+        holidays += {4: [christmas, christmas + 3], 5: [christmas + 2, christmas + 3],
+                     6: [christmas + 1, christmas + 2]}.get(int(_weekday(christmas)), [christmas, christmas + 1])
+
+    holidays = np.array(holidays, dtype='datetime64[D]')
+    for regular, moved in MOVED_HOLIDAYS.items():
+        holidays[holidays == np.datetime64(regular)] = np.datetime64(moved)
+    return np.union1d(holidays, np.array(SPECIAL_HOLIDAYS, dtype='datetime64[D]'))
+
+
+class CalendarTable:
+    """
+    Day-by-day calendar features from `start` to `end` inclusive.
+
+    `day_index` counts days from `start`. `weekday` is int8 with Monday = 0 (names
+    in WEEKDAYS). `dst_change` is +1 on the autumn clock change (a 25 hour day),
+    -1 on the spring one (23 hours) and 0 otherwise, and `settlement_periods` is
+    the number of half-hour settlement periods in the day (46, 48 or 50).
+    `bst_midnight` is True where clocks are on BST at the start of the day.
+    """
+    def __init__(self, start='2010-01-01', end='2030-12-31'):
+        self.start = np.datetime64(start, 'D')
+        self.end = np.datetime64(end, 'D')
+        self.dates = np.arange(self.start, self.end + 1, dtype='datetime64[D]')
+
+        self.day_index = np.arange(len(self.dates), dtype=np.int32)
+        year_start = self.dates.astype('datetime64[Y]')
+        self.year = (year_start.astype(np.int64) + 1970).astype(np.int16)
+        self.doy = ((self.dates - year_start.astype('datetime64[D]')).astype(np.int64) + 1).astype(np.int16)
+        self.weekday = _weekday(self.dates).astype(np.int8)
+        self.is_weekend = self.weekday >= 5
+
+        years = range(int(self.year[0]), int(self.year[-1]) + 1)
+        self.bank_holiday = np.isin(self.dates, bank_holidays(years))
+        self.is_working_day = ~(self.is_weekend | self.bank_holiday)
+
+        # UK clocks change on the last Sundays of March and October.
+        self.dst_change = np.zeros(len(self.dates), dtype=np.int8)
+        self.dst_change[np.isin(self.dates, [_last_weekday(y, 3, 6) for y in years])] = -1
+        self.dst_change[np.isin(self.dates, [_last_weekday(y, 10, 6) for y in years])] = 1
+        self.settlement_periods = (48 + 2*self.dst_change).astype(np.int8)
+
+        # BST from the day after the spring change up to and including the autumn one.
+        spring = np.array([_last_weekday(y, 3, 6) for y in years])
+        autumn = np.array([_last_weekday(y, 10, 6) for y in years])
+        year_index = self.year - self.year[0]
+        self.bst_midnight = (self.dates > spring[year_index]) & (self.dates <= autumn[year_index])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def covers(self, dates):
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        return len(dates) == 0 or (dates.min() >= self.start and dates.max() <= self.end)
+
+    def rows(self, dates):
+        """Row of each date in the table, as an integer array."""
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        if not self.covers(dates):
+            raise KeyError('Dates outside the calendar ({} to {})'.format(self.start, self.end))
+        return (dates - self.start).astype(np.int64)
+
+    def lookup(self, dates):
+        """All the features for a column of dates, as a DataFrame."""
+        rows = self.rows(dates)
+        return pd.DataFrame({'day_index': self.day_index[rows], 'year': self.year[rows], 'doy': self.doy[rows],
+                             'weekday': pd.Categorical.from_codes(self.weekday[rows], WEEKDAYS),
+                             'is_weekend': self.is_weekend[rows], 'bank_holiday': self.bank_holiday[rows],
+                             'dst_change': self.dst_change[rows],
+                             'settlement_periods': self.settlement_periods[rows]})
+
+
+_calendar = CalendarTable()
+
+
+def calendar(dates=None):
+    """
+    The shared CalendarTable, rebuilt over a wider range if `dates` fall outside it.
+    """
+    global _calendar
+    if dates is not None and not _calendar.covers(dates):
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        start = min(_calendar.start, dates.min().astype('datetime64[Y]').astype('datetime64[D]'))
+        end = max(_calendar.end, (dates.max().astype('datetime64[Y]') + 1).astype('datetime64[D]') - 1)
+        _calendar = CalendarTable(start, end)
+    return _calendar
+
+
+def parse_dates(labels, format='%d-%b-%Y'):
+    """
+    Parse a column of date strings (DemandData's 01-JAN-2019 by default) to
+    datetime64[D], parsing each distinct string once.
+    """
+    codes, uniques = pd.factorize(np.asarray(labels))
+    return pd.to_datetime(uniques, format=format).values.astype('datetime64[D]')[codes]
+
+
+def _bad_settlement_days(table, rows, periods):
+    # Per-day row counts by bincount over calendar rows, so no sort is needed.
+    first = rows.min()
+    day = rows - first
+    counts = np.bincount(day)
+    expected = table.settlement_periods[first:first + len(counts)].astype(np.int64)
+    out_of_range = np.bincount(day, weights=(periods < 1) | (periods > expected[day]), minlength=len(counts)) > 0
+    return table.dates[first:first + len(counts)][(counts > 0) & ((counts % expected != 0) | out_of_range)]
+
+
+def check_settlement_periods(dates, periods):
+    """
+    Dates whose rows are not whole days of settlement periods: the number of rows
+    is not a multiple of the day's settlement_periods, or a period is outside
+    1..settlement_periods. Files stacking several series (e.g. one per region)
+    may have several full days of rows per date.
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    table = calendar(dates)
+    return _bad_settlement_days(table, table.rows(dates), np.asarray(periods, dtype=np.int64))
+
+
+def settlement_timestamps(dates, periods, validate=True):
+    """
+    UTC start of each settlement period, as a tz-aware DatetimeIndex.
+
+    Period 1 starts at local midnight, which is 23:00 UTC the previous day while
+    BST is in force, and the periods then follow each other every half hour of
+    real time, so the 46 and 50 period clock-change days need no special case.
+    With `validate`, dates that are not whole days of periods raise a ValueError.
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    periods = np.asarray(periods, dtype=np.int64)
+    table = calendar(dates)
+    rows = table.rows(dates)
+    if validate and len(rows):
+        bad = _bad_settlement_days(table, rows, periods)
+        if len(bad):
+            raise ValueError('Settlement periods do not match the clock changes on {}'.format(list(bad.astype(str))))
+
+    minutes = 1440*rows - 60*table.bst_midnight[rows] + 30*(periods - 1)
+    stamps = table.start.astype('datetime64[m]') + minutes.astype('timedelta64[m]')
+    return pd.DatetimeIndex(stamps.astype('datetime64[ns]')).tz_localize('UTC')
@@ -5,21 +5,35 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
+from instrumentation import instrumented
+
+try:
+    from .regional import AreaCounts
+except ImportError:
+    from regional import AreaCounts
+
 class CoronaData:
-    def __init__(self, cases_file, deaths_file):
+    @instrumented
+    def __init__(self, cases_file, deaths_file, regional_file=None, **regional_columns):
         self.cases = pd.read_csv(cases_file)
         self.cases['Date'] = pd.to_datetime(self.cases['Date'], format='%d-%b-%Y')
         
         self.deaths = pd.read_csv(deaths_file)
         self.deaths['Date'] = pd.to_datetime(self.deaths['Date'], format='%d-%b-%Y')
         
+        # Per-area counts, e.g. local authority cases from coronavirus.data.gov.uk.
+        self.regional = AreaCounts.from_csv(regional_file, **regional_columns) if regional_file else None
+        
     def get_cases(self):
         return self.cases
         
     def get_deaths(self):
         return self.deaths
         
-    def plot_cases(self, figsize=(12,6), colors=['k', 'darkturquoise']):
+    def get_regional(self):
+        return self.regional
+        
+    def _plot_counts(self, table, kind, figsize, colors):
         
         locator = mdates.AutoDateLocator(minticks=3, maxticks=7)
         formatter = mdates.ConciseDateFormatter(locator)
@@ -27,38 +41,24 @@ class CoronaData:
         fig, ax1 = plt.subplots(figsize=figsize)
 
         ax1.set_xlabel('Date'); ax1.xaxis.set_major_locator(locator); ax1.xaxis.set_major_formatter(formatter)
-        ax1.set_ylabel('New Cases', color=colors[0])
-        ax1.bar(self.cases['Date'], self.cases['New_cases'], color=colors[0])
+        ax1.set_ylabel('New '+kind.capitalize(), color=colors[0])
+        ax1.bar(table['Date'], table['New_'+kind], color=colors[0])
         ax1.tick_params(axis='y', labelcolor=colors[0])
         
         ax2 = ax1.twinx()  # instantiate a second axes that shares the same x-axis
         
         ax2.xaxis.set_major_locator(locator); ax2.xaxis.set_major_formatter(formatter)
-        ax2.set_ylabel('Total Cases', color=colors[1])  # we already handled the x-label with ax1
-        ax2.plot(self.cases['Date'], self.cases['Total_cases'], color=colors[1], linewidth=2)
+        ax2.set_ylabel('Total '+kind.capitalize(), color=colors[1])  # we already handled the x-label with ax1
+        ax2.plot(table['Date'], table['Total_'+kind], color=colors[1], linewidth=2)
         ax2.tick_params(axis='y', labelcolor=colors[1])
         
         fig.tight_layout()  # otherwise the right y-label is slightly clipped
         plt.show()
 
-    def plot_deaths(self, figsize=(12,6), colors=['k', 'darkturquoise']):
-        
-        locator = mdates.AutoDateLocator(minticks=3, maxticks=7)
-        formatter = mdates.ConciseDateFormatter(locator)
-        
-        fig, ax1 = plt.subplots(figsize=figsize)
+    @instrumented
+    def plot_cases(self, figsize=(12,6), colors=['k', 'darkturquoise']):
+        self._plot_counts(self.cases, 'cases', figsize, colors)
 
-        ax1.set_xlabel('Date'); ax1.xaxis.set_major_locator(locator); ax1.xaxis.set_major_formatter(formatter)
-        ax1.set_ylabel('New Deaths', color=colors[0])
-        ax1.bar(self.deaths['Date'], self.deaths['New_deaths'], color=colors[0])
-        ax1.tick_params(axis='y', labelcolor=colors[0])
-        
-        ax2 = ax1.twinx()  # instantiate a second axes that shares the same x-axis
-        
-        ax2.xaxis.set_major_locator(locator); ax2.xaxis.set_major_formatter(formatter)
-        ax2.set_ylabel('Total Deaths', color=colors[1])  # we already handled the x-label with ax1
-        ax2.plot(self.deaths['Date'], self.deaths['Total_deaths'], color=colors[1], linewidth=2)
-        ax2.tick_params(axis='y', labelcolor=colors[1])
-        
-        fig.tight_layout()  # otherwise the right y-label is slightly clipped
-        plt.show()
+    @instrumented
+    def plot_deaths(self, figsize=(12,6), colors=['k', 'darkturquoise']):
+        self._plot_counts(self.deaths, 'deaths', figsize, colors)
@@ -0,0 +1,126 @@
+"""
+Sparse area x day storage for local-authority COVID counts.
+
+Reads the long-format downloads from coronavirus.data.gov.uk (one row per area
+and date, e.g. areaCode, areaName, date, newCasesBySpecimenDate) into a single
+CSR matrix with an area index and a daily date axis. Rolling sums are a product
+with a banded matrix, and regional totals a product with a sparse
+region x area indicator matrix, so no per-area DataFrames are built.
+
+    cases = AreaCounts.from_csv('./covid/ltla_cases.csv')
+    rates = cases.rolling_rate(window=7, population=population)   # per 100,000
+    regions = cases.group_by(lad_to_region)
+"""
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from instrumentation import instrumented, span
+
+
+class AreaCounts:
+    """
+    Daily counts for a set of areas, as an (areas, days) scipy.sparse CSR matrix.
+
+    `areas` is a pandas Index of area codes (rows) and `dates` a datetime64[D]
+    array of consecutive days (columns). `names` maps area codes to names.
+    """
+    def __init__(self, counts, areas, dates, names=None):
+        self.counts = sp.csr_matrix(counts)
+        self.areas = pd.Index(areas)
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.names = names if names is not None else pd.Series(self.areas, index=self.areas)
+
+    @classmethod
+    @instrumented
+    def from_csv(cls, data_file, area_column='areaCode', name_column='areaName', date_column='date',
+                 value_column='newCasesBySpecimenDate', date_format='%Y-%m-%d'):
+        """Load a long-format file of (area, date, count) rows."""
+        with span('read_csv'):
+            table = pd.read_csv(data_file, usecols=[area_column, name_column, date_column, value_column],
+                                dtype={area_column: 'category', name_column: 'category'})
+        return cls.from_frame(table, area_column, name_column, date_column, value_column, date_format)
+
+    @classmethod
+    def from_frame(cls, table, area_column='areaCode', name_column='areaName', date_column='date',
+                   value_column='newCasesBySpecimenDate', date_format='%Y-%m-%d'):
+        area_index, areas = pd.factorize(table[area_column], sort=True)
+        dates = pd.to_datetime(table[date_column], format=date_format).values.astype('datetime64[D]')
+        start, end = dates.min(), dates.max()
+        day_index = (dates - start).astype(np.int64)
+
+        values = table[value_column].fillna(0).values.astype(np.float64)
+        counts = sp.coo_matrix((values, (area_index, day_index)),
+                               shape=(len(areas), int(day_index.max()) + 1)).tocsr()
+        counts.eliminate_zeros()
+
+        names = table[[area_column, name_column]].drop_duplicates(area_column).set_index(area_column)[name_column]
+        return cls(counts, areas, np.arange(start, end + 1), names.reindex(areas).astype(str))
+
+    def __len__(self):
+        return len(self.areas)
+
+    def _view(self, counts, areas=None, dates=None, names=None):
+        return AreaCounts(counts, self.areas if areas is None else areas, self.dates if dates is None else dates,
+                          self.names if names is None else names)
+
+    def rows(self, areas):
+        """Row indices of area codes."""
+        rows = self.areas.get_indexer(pd.Index(np.atleast_1d(areas)))
+        if (rows < 0).any():
+            raise KeyError('Unknown areas: {}'.format(list(np.atleast_1d(areas)[rows < 0])))
+        return rows
+
+    def select(self, areas=None, start=None, end=None):
+        """A view restricted to some areas and/or an inclusive date range."""
+        rows = self.rows(areas) if areas is not None else np.arange(len(self.areas))
+        first = np.searchsorted(self.dates, np.datetime64(start, 'D')) if start is not None else 0
+        last = np.searchsorted(self.dates, np.datetime64(end, 'D'), 'right') if end is not None else len(self.dates)
+        return self._view(self.counts[rows][:, first:last], self.areas[rows], self.dates[first:last],
+                          self.names.iloc[rows])
+
+    def rolling_sum(self, window=7):
+        """
+        Sum over the `window` days up to and including each day, as a product with a
+        banded (days, days) matrix. The first window-1 days sum over fewer days.
+        """
+        days = len(self.dates)
+        band = sp.diags([np.ones(days - k) for k in range(min(window, days))], list(range(min(window, days))),
+                        shape=(days, days), format='csr')
+        return self._view(self.counts @ band)
+
+    def rolling_rate(self, window=7, population=None, per=100000):
+        """
+        Rolling sums per `per` people, with `population` a Series indexed by area
+        code (or an array in area order). Without a population, the rolling mean.
+        """
+        sums = self.rolling_sum(window).counts
+        if population is None:
+            return self._view(sums/window)
+        if isinstance(population, pd.Series):
+            population = population.reindex(self.areas).values
+        scale = sp.diags(per/np.asarray(population, dtype=np.float64))
+        return self._view(scale @ sums)
+
+    def group_by(self, mapping):
+        """
+        Totals for groups of areas (e.g. regions), with `mapping` a Series or dict
+        from area code to group name. Areas without a group are left out.
+        """
+        groups = pd.Series(mapping).reindex(self.areas)
+        known = groups.notna().values
+        group_index, group_names = pd.factorize(groups[known], sort=True)
+        indicator = sp.csr_matrix((np.ones(len(group_index)), (group_index, np.flatnonzero(known))),
+                                  shape=(len(group_names), len(self.areas)))
+        names = pd.Series(group_names, index=group_names)
+        return self._view(indicator @ self.counts, areas=group_names, names=names)
+
+    def total(self):
+        """Total over all areas, as a Series indexed by date."""
+        return pd.Series(np.asarray(self.counts.sum(axis=0)).ravel(), index=pd.DatetimeIndex(self.dates))
+
+    def to_frame(self, areas=None, start=None, end=None):
+        """Dense (dates, areas) DataFrame of a selection, e.g. for plotting or correlation."""
+        view = self.select(areas, start, end) if (areas is not None or start is not None or end is not None) else self
+        return pd.DataFrame(view.counts.toarray().T, index=pd.DatetimeIndex(view.dates, name='Date'),
+                            columns=view.areas)
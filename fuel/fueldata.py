@@ -0,0 +1,120 @@
+"""
+Weekly UK pump prices, duty and VAT, and their relation to daily traffic.
+
+    fuel = FuelData('./fuel/fuel_prices.csv')
+    fuel.decompose()                              # pump price = duty + VAT + net, per fuel
+    fuel.as_of(traffic.transport.Date)            # weekly prices carried forward onto days
+    fuel.elasticity_scan(traffic)                 # every vehicle type x lag x window at once
+"""
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented, span
+
+# Ultra-low sulphur petrol and diesel.
+FUELS = ['ULSP', 'ULSD']
+
+
+class FuelData:
+    """
+    Prices in pence per litre and VAT in percent, as float32 (weeks, fuels) arrays
+    sorted by the datetime64[D] `dates` of the weekly survey.
+    """
+    @instrumented
+    def __init__(self, fuel_file='./fuel/fuel_prices.csv'):
+        with span('read_csv'):
+            prices = pd.read_csv(fuel_file, dtype={column + '_' + fuel: np.float32 for fuel in FUELS
+                                                   for column in ['PUMP_PRICE', 'DUTY_RATE', 'VAT_PERC']})
+        dates = pd.to_datetime(prices['Date'], format='%d/%m/%Y').values.astype('datetime64[D]')
+        order = np.argsort(dates, kind='stable')
+
+        self.dates = dates[order]
+        columns = lambda name: prices[[name + '_' + fuel for fuel in FUELS]].values[order]
+        self.pump = columns('PUMP_PRICE')
+        self.duty = columns('DUTY_RATE')
+        self.vat_percent = columns('VAT_PERC')
+
+        # Pump prices include VAT on top of the duty and the net (pre-tax) price.
+        self.vat = self.pump*self.vat_percent/(100 + self.vat_percent)
+        self.net = self.pump - self.duty - self.vat
+
+    def decompose(self):
+        """Weekly pump price split into duty, VAT and net price for each fuel (p/litre)."""
+        parts = {'pump': self.pump, 'duty': self.duty, 'vat': self.vat, 'net': self.net}
+        return pd.DataFrame({'{}_{}'.format(part, fuel): values[:, i] for part, values in parts.items()
+                             for i, fuel in enumerate(FUELS)}, index=pd.DatetimeIndex(self.dates, name='Date'))
+
+    def rows(self, dates):
+        """Row of the latest survey on or before each date (-1 before the first)."""
+        return np.searchsorted(self.dates, np.asarray(dates, dtype='datetime64[D]'), side='right') - 1
+
+    def as_of(self, dates, part='pump'):
+        """The `part` price of each fuel in force on each date, as a (dates, fuels) array."""
+        values = getattr(self, part)
+        rows = self.rows(dates)
+        return np.where((rows >= 0)[:, None], values[np.maximum(rows, 0)], np.nan)
+
+    def resample_onto(self, traffic):
+        """Prices and their components carried forward onto the days of Traffic.transport."""
+        dates = traffic.transport.Date.values
+        table = pd.DataFrame({'Date': dates})
+        for part in ['pump', 'duty', 'vat', 'net']:
+            values = self.as_of(dates, part)
+            for i, fuel in enumerate(FUELS):
+                table['{}_{}'.format(part, fuel)] = values[:, i]
+        return table
+
+    @instrumented
+    def elasticity_scan(self, traffic, lags=range(0, 29), windows=(1, 7, 14, 28), fuel='ULSP', part='pump',
+                        vehicle_types=None):
+        """
+        Log-log slope of traffic against the lagged, trailing-mean fuel price.
+
+        For every lag (days) and window (days of trailing mean) the regressor is
+        log of the mean `part` price over the `window` days ending `lag` days
+        before each traffic day. All (lag, window) regressors and all vehicle
+        types are fitted together: the simple-regression sums for every pair come
+        from three matrix products, with each vehicle's missing days masked out.
+
+        Returns a DataFrame indexed by (vehicle, lag, window) with the elasticity,
+        intercept, R² and number of days used.
+        """
+        vehicle_types = list(traffic.vehicle_types if vehicle_types is None else vehicle_types)
+        dates = traffic.transport.Date.values.astype('datetime64[D]')
+        lags, windows = list(lags), list(windows)
+
+        # Daily prices far enough back for the longest lag and window.
+        history = max(lags) + max(windows)
+        days = np.arange(dates.min() - history, dates.max() + 1)
+        daily = self.as_of(days, part)[:, FUELS.index(fuel)].astype(np.float64)
+        cumulative = np.concatenate(([0], np.cumsum(daily)))
+
+        # (dates, configurations) matrix of log trailing-mean lagged prices.
+        position = (dates - days[0]).astype(np.int64)
+        configurations = [(lag, window) for lag in lags for window in windows]
+        end = position[:, None] - np.array([lag for lag, _ in configurations]) + 1
+        width = np.array([window for _, window in configurations])
+        X = np.log((cumulative[end] - cumulative[end - width])/width)
+
+        with np.errstate(divide='ignore'):
+            Y = np.log(traffic.transport[vehicle_types].values.astype(np.float64))
+        mask = np.isfinite(Y) & np.isfinite(X).all(axis=1)[:, None]
+        Y0 = np.where(mask, Y, 0)
+        M = mask.astype(np.float64)
+        X0 = np.nan_to_num(X)
+
+        with span('elasticity.solve'):
+            n = M.sum(axis=0)
+            sx, sxx, sxy = X0.T @ M, (X0**2).T @ M, X0.T @ Y0
+            sy, syy = Y0.sum(axis=0), (Y0**2).sum(axis=0)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = n*sxy - sx*sy
+            slope = covariance/(n*sxx - sx**2)
+            intercept = (sy - slope*sx)/n
+            r2 = covariance**2/((n*sxx - sx**2)*(n*syy - sy**2))
+
+        index = pd.MultiIndex.from_tuples([(v, lag, window) for v in vehicle_types for lag, window in configurations],
+                                          names=['vehicle', 'lag', 'window'])
+        return pd.DataFrame({'elasticity': slope.T.ravel(), 'intercept': intercept.T.ravel(), 'r2': r2.T.ravel(),
+                             'days': np.broadcast_to(n, slope.shape).T.ravel()}, index=index)
@@ -0,0 +1,148 @@
+"""
+Half-hourly carbon accounting for GB electricity, from the National Grid demand files.
+
+For every settlement period the energy from GB transmission-connected generation is
+
+    ND - net interconnector imports
+
+since ND is met by transmission-connected generation and imports (embedded wind
+and solar are already netted out of it), and net imports are the summed
+interconnector flows (positive into GB). Multiplying by a carbon intensity
+(gCO2/kWh, i.e. kgCO2/MWh) gives the period's emissions. Days with periods not
+yet settled (published as ND = 0) are left out whole.
+
+The energy is computed once; emissions for any intensity assumption are a
+multiply and a reduceat over the multi-year arrays, and annual totals for a
+whole matrix of scenarios are a single product:
+
+    carbon = CarbonAccounting.from_core(grid_data.core)
+    carbon.daily(intensity={2019: 210, 2020: 180})
+    carbon.annual_totals({'low': {2019: 180, 2020: 150}, 'high': {2019: 260, 2020: 230}})
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .counterfactual import INTERCONNECTORS
+except ImportError:
+    from counterfactual import INTERCONNECTORS
+
+from calendar_table import parse_dates, settlement_timestamps
+
+from instrumentation import instrumented
+
+# Hours in a settlement period.
+PERIOD_HOURS = 0.5
+
+
+class CarbonAccounting:
+    """
+    Energy balance of every settlement period in a set of DemandData rows.
+
+    The energy arrays (MWh) are sorted by date and settlement period, with the
+    UTC start of each period in `timestamps`; `day_starts` and `year_starts` index
+    the first period of each day and year, for reduceat.
+    """
+    @instrumented
+    def __init__(self, rows):
+        dates = parse_dates(rows['SETTLEMENT_DATE'])
+        complete = ~np.isin(dates, dates[rows['ND'].values <= 0])
+        rows, dates = rows[complete], dates[complete]
+        order = np.lexsort((rows['SETTLEMENT_PERIOD'].values, dates))
+        self.dates = dates[order]
+        self.periods = rows['SETTLEMENT_PERIOD'].values[order]
+        self.timestamps = settlement_timestamps(self.dates, self.periods)
+
+        energy = lambda column: PERIOD_HOURS*rows[column].values[order].astype(np.float64)
+        self.wind = energy('EMBEDDED_WIND_GENERATION')
+        self.solar = energy('EMBEDDED_SOLAR_GENERATION')
+        national_demand = energy('ND')
+        # Demand including what embedded generation meets, for the daily table.
+        self.underlying_demand = national_demand + self.wind + self.solar
+        flows = [c for c in INTERCONNECTORS if c in rows.columns]
+        self.net_imports = PERIOD_HOURS*rows[flows].fillna(0).values[order].sum(axis=1)
+
+        # Energy from GB transmission-connected generation.
+        self.generation = national_demand - self.net_imports
+
+        new_day = np.r_[True, self.dates[1:] != self.dates[:-1]]
+        self.day_starts = np.flatnonzero(new_day)
+        self.days = self.dates[self.day_starts]
+
+        year = self.dates.astype('datetime64[Y]').astype(np.int64) + 1970
+        self.year_starts = np.flatnonzero(np.r_[True, year[1:] != year[:-1]])
+        self.years = year[self.year_starts]
+        self.year_index = np.cumsum(np.r_[True, year[1:] != year[:-1]]) - 1
+
+        self.daily_generation = np.add.reduceat(self.generation, self.day_starts)
+        self.annual_generation = np.add.reduceat(self.generation, self.year_starts)
+
+    @classmethod
+    def from_core(cls, core):
+        """Accounts for the half-hourly rows of a GridDataCore."""
+        return cls(core.grid)
+
+    def intensity(self, intensity):
+        """
+        Carbon intensity (gCO2/kWh) broadcast against the settlement periods.
+
+        `intensity` is a number, a {year: intensity} dictionary, a per-period array,
+        or a (scenarios, periods) array.
+        """
+        if isinstance(intensity, dict):
+            return np.array([intensity[year] for year in self.years], dtype=np.float64)[self.year_index]
+        return np.asarray(intensity, dtype=np.float64)
+
+    def emissions(self, intensity):
+        """Emissions (tCO2) of every settlement period, per scenario if several are given."""
+        return self.generation*self.intensity(intensity)/1000
+
+    def half_hourly(self, intensity):
+        """Emissions (tCO2) of every settlement period, as a Series indexed by its UTC start."""
+        return pd.Series(self.emissions(intensity), index=self.timestamps, name='co2')
+
+    def daily(self, intensity):
+        """Daily emissions (tCO2), as a (days,) or (scenarios, days) array."""
+        return np.add.reduceat(self.emissions(intensity), self.day_starts, axis=-1)
+
+    def annual_totals(self, scenarios):
+        """
+        Annual emissions (tCO2) under each of a set of intensity scenarios.
+
+        `scenarios` maps a name to a {year: intensity} dictionary; the totals are
+        one (scenarios, years) x (years,) product with the annual generation.
+        """
+        matrix = np.array([[scenario[year] for year in self.years] for scenario in scenarios.values()], dtype=np.float64)
+        return pd.DataFrame(matrix*self.annual_generation/1000, index=list(scenarios), columns=self.years)
+
+    def daily_table(self, intensity):
+        """Daily energy balance (MWh) and emissions (tCO2)."""
+        reduce = lambda values: np.add.reduceat(values, self.day_starts)
+        return pd.DataFrame({'date': self.days,
+                             'underlying_demand': reduce(self.underlying_demand),
+                             'embedded_wind': reduce(self.wind),
+                             'embedded_solar': reduce(self.solar),
+                             'net_imports': reduce(self.net_imports),
+                             'generation': self.daily_generation,
+                             'co2': self.daily(intensity)})
+
+    def compare_power(self, emissions, intensity, baseline_days=364):
+        """
+        Daily change in GB power emissions next to the Power sector of Emissions.sectors.
+
+        The change is against the same weekday `baseline_days` earlier, in MtCO2
+        per day like the sector estimates. The sector series is global, so the
+        two are comparable in timing and shape rather than magnitude; `share` is
+        the GB fraction of the global change.
+        """
+        daily = pd.Series(self.daily(intensity), index=self.days)
+        baseline = daily.reindex(self.days - np.timedelta64(baseline_days, 'D')).values
+        sector = emissions.sectors.series('Power')
+
+        table = pd.DataFrame({'date': self.days,
+                              'gb_power': daily.values/1e6,
+                              'gb_change': (daily.values - baseline)/1e6})
+        table['global_power_change'] = sector.reindex(self.days).values.astype(float)
+        table['share'] = table.gb_change/table.global_power_change
+        return table.dropna(subset=['global_power_change']).reset_index(drop=True)
@@ -0,0 +1,194 @@
+"""
+Streaming counterfactual for national demand, fitted by recursive least squares.
+
+Unlike the GP in GridData, which depends on time only and is refitted offline,
+this model learns demand from calendar, weather and embedded-generation features
+one settlement period at a time. Each update costs O(p^2) for p features, so
+new DemandDataUpdate.csv-style rows can be folded in as they arrive. After
+`freeze_date` the model stops learning and the residuals measure the lockdown
+effect: how far demand sits from what the pre-lockdown relationships expect.
+
+    model = DemandCounterfactual(weather_file='./transport/UK_weather.csv')
+    history = model.stream(pd.read_csv('./grid/combined.csv'))
+    for effects in model.stream_file('./grid/DemandDataUpdate.csv'):
+        ...
+
+The weather features are only used when the weather file covers at least a
+year of the learning period; otherwise they would be fitted to a few winter
+weeks and extrapolated. Periods that have not been settled yet (published as
+zero demand) are skipped. `python -m grid.counterfactual`, run from the
+repository root, streams the shipped files and checks that the lockdown ratio
+is plausible.
+"""
+import os
+import glob
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from calendar_table import calendar
+
+from instrumentation import instrumented, span
+
+INTERCONNECTORS = ['FRENCH_FLOW', 'BRITNED_FLOW', 'MOYLE_FLOW', 'EAST_WEST_FLOW', 'NEMO_FLOW']
+
+FEATURES = (['intercept', 'year_sin', 'year_cos', 'half_year_sin', 'half_year_cos']
+            + ['day_sin_{}'.format(k) for k in (1, 2, 3)] + ['day_cos_{}'.format(k) for k in (1, 2, 3)]
+            + ['weekday_{}'.format(d) for d in range(1, 7)]
+            + ['temperature_anomaly', 'heating_degrees', 'embedded_wind', 'embedded_solar', 'net_imports', 'bank_holiday'])
+
+# Mean daily temperature below which heating demand rises (degrees C).
+HEATING_THRESHOLD = 15.5
+
+# Days of weather needed in the learning period before the weather features are used.
+MIN_WEATHER_DAYS = 365
+
+# Plausible range of the median ratio of actual to expected demand after the freeze.
+RATIO_BOUNDS = (0.6, 1.2)
+
+# Rows the model must have learnt from before its RATIO is reported: a day of
+# settlement periods. Before that EXPECTED is near zero (exactly zero at first).
+MIN_RATIO_UPDATES = 48
+
+
+def load_weather(weather_file):
+    """Daily temperature and its anomaly from the monthly average, indexed by date."""
+    weather = pd.read_csv(weather_file)
+    weather.index = pd.to_datetime(weather['date'], format='%d/%m/%Y').values.astype('datetime64[D]')
+    average = [c for c in weather.columns if c.startswith('avg_monthly_temperature')][0]
+    return pd.DataFrame({'temperature': weather.temperature,
+                         'anomaly': weather.temperature - weather[average]})
+
+
+def settled(rows):
+    """Rows with a settled demand; later periods are published with ND = 0."""
+    return rows[rows['ND'].values > 0]
+
+
+def check_ratio(effects, freeze_date='2020-03-23', bounds=RATIO_BOUNDS):
+    """Raise a ValueError if the median ratio after `freeze_date` is outside `bounds`."""
+    after = effects.RATIO[effects.DATE.values >= np.datetime64(freeze_date, 'D')]
+    if len(after) and not bounds[0] <= after.median() <= bounds[1]:
+        raise ValueError('Median demand ratio after {} is {:.2f}, outside {}'.format(freeze_date, after.median(),
+                                                                                      bounds))
+    return after.median()
+
+
+class DemandCounterfactual:
+    def __init__(self, weather_file=None, forgetting=0.99995, delta=100.0, freeze_date='2020-03-23'):
+        self.forgetting = forgetting
+        self.freeze_date = np.datetime64(freeze_date, 'D') if freeze_date else None
+
+        self.weather = load_weather(weather_file) if weather_file else None
+        if self.weather is not None:
+            known = self.weather.index[np.isfinite(self.weather.temperature.values)]
+            learning = (known < self.freeze_date).sum() if self.freeze_date is not None else len(known)
+            if learning < MIN_WEATHER_DAYS:
+                warnings.warn('{} has {} days of weather before the freeze date, fewer than {}; leaving out the '
+                              'weather features'.format(weather_file, learning, MIN_WEATHER_DAYS))
+                self.weather = None
+
+        self.theta = np.zeros(len(FEATURES))
+        self.P = delta*np.eye(len(FEATURES))
+        self.n_updates = 0
+
+    def features(self, rows):
+        """
+        Feature matrix for a DataFrame of DemandData rows, without a per-row loop.
+        Unsettled rows are dropped, as in `stream`.
+        """
+        rows = settled(rows)
+        dates = pd.to_datetime(rows['SETTLEMENT_DATE'], format='%d-%b-%Y').values.astype('datetime64[D]')
+        table = calendar(dates)
+        days = table.rows(dates)
+        hour = (rows['SETTLEMENT_PERIOD'].values - 1)/2
+
+        X = np.zeros((len(rows), len(FEATURES)))
+        X[:, 0] = 1
+        year = 2*np.pi*table.doy[days]/365.25
+        X[:, 1:5] = np.column_stack([np.sin(year), np.cos(year), np.sin(2*year), np.cos(2*year)])
+        day = 2*np.pi*np.outer(hour/24, [1, 2, 3])
+        X[:, 5:8], X[:, 8:11] = np.sin(day), np.cos(day)
+        X[:, 11:17] = table.weekday[days][:, None] == np.arange(1, 7)
+
+        if self.weather is not None:
+            weather = self.weather.reindex(dates)
+            known = np.isfinite(weather.temperature.values)
+            X[:, 17] = np.where(known, weather.anomaly.values, 0)
+            X[:, 18] = np.where(known, np.clip(HEATING_THRESHOLD - weather.temperature.values, 0, None), 0)
+
+        # Embedded generation and interconnector flows in GW, like the demand.
+        X[:, 19] = rows['EMBEDDED_WIND_GENERATION'].values/1000
+        X[:, 20] = rows['EMBEDDED_SOLAR_GENERATION'].values/1000
+        flows = [c for c in INTERCONNECTORS if c in rows.columns]
+        X[:, 21] = rows[flows].fillna(0).values.sum(axis=1)/1000
+
+        X[:, 22] = table.bank_holiday[days]
+
+        return X, dates
+
+    def predict(self, x):
+        return x @ self.theta
+
+    def update(self, x, y, learn=True):
+        """
+        Fold in one settlement period and return the a-priori prediction and residual.
+        """
+        prediction = x @ self.theta
+        residual = y - prediction
+        if learn:
+            Px = self.P @ x
+            gain = Px/(self.forgetting + x @ Px)
+            self.theta += gain*residual
+            self.P = (self.P - np.outer(gain, Px))/self.forgetting
+            self.n_updates += 1
+        return prediction, residual
+
+    @instrumented
+    def stream(self, rows):
+        """
+        Update the model with a block of DemandData rows, in order.
+
+        Returns each row's expected demand and the lockdown effect (MW), computed
+        before the row itself was learnt from. Rows on or after `freeze_date` are
+        predicted but not learnt from, and unsettled rows (ND = 0) are skipped.
+        RATIO is NaN until the model has learnt from MIN_RATIO_UPDATES rows.
+        """
+        rows = settled(rows)
+        X, dates = self.features(rows)
+        y = rows['ND'].values/1000
+        learn = dates < self.freeze_date if self.freeze_date is not None else np.ones(len(dates), dtype=bool)
+
+        expected = np.empty(len(y))
+        learnt = np.empty(len(y), dtype=np.int64)
+        with span('rls.update'):
+            for i in range(len(y)):
+                learnt[i] = self.n_updates
+                expected[i], _ = self.update(X[i], y[i], learn[i])
+        ratio = np.divide(y, expected, out=np.full_like(y, np.nan),
+                          where=(learnt >= MIN_RATIO_UPDATES) & (expected != 0))
+
+        return pd.DataFrame({'DATE': dates,
+                             'SETTLEMENT_PERIOD': rows['SETTLEMENT_PERIOD'].values,
+                             'ND': rows['ND'].values,
+                             'EXPECTED': expected*1000,
+                             'EFFECT': (y - expected)*1000,
+                             'RATIO': ratio})
+
+    def stream_file(self, demand_file, chunksize=48):
+        """Stream a DemandData file through the model, one chunk of rows at a time."""
+        for rows in pd.read_csv(demand_file, chunksize=chunksize):
+            yield self.stream(rows)
+
+    def coefficients(self):
+        return pd.Series(self.theta, index=FEATURES)
+
+
+if __name__ == '__main__':
+    grid = os.path.dirname(os.path.abspath(__file__))
+    model = DemandCounterfactual(weather_file=os.path.join(os.path.dirname(grid), 'transport', 'UK_weather.csv'))
+    history = pd.concat([pd.read_csv(f) for f in sorted(glob.glob(os.path.join(grid, 'DemandData_*.csv')))],
+                        ignore_index=True)
+    effects = pd.concat([model.stream(history), model.stream(pd.read_csv(os.path.join(grid, 'DemandDataUpdate.csv')))])
+    print('Median ratio after the freeze: {:.3f}'.format(check_ratio(effects)))
@@ -0,0 +1,191 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from calendar_table import calendar, parse_dates, settlement_timestamps
+
+from instrumentation import instrumented, span
+
+try:
+    from .profiles import LoadProfiles
+except ImportError:
+    from profiles import LoadProfiles
+
+# Index of the first datapoint from the lockdown period.
+COVID_CUTOFF = 1881
+
+_cores = {}
+
+
+def load_core(grid_file):
+    """
+    Return the GridDataCore for a file, parsing and aggregating it only once.
+
+    Cores are shared between every front-end (Bokeh or matplotlib) that loads the
+    same unmodified file.
+    """
+    path = os.path.abspath(grid_file)
+    key = (path, os.path.getmtime(path))
+    if key not in _cores:
+        _cores[key] = GridDataCore(path)
+    return _cores[key]
+
+
+def register_core(grid_file, core):
+    """Add a core built elsewhere (e.g. in a worker process) to the cache."""
+    path = os.path.abspath(grid_file)
+    _cores[(path, os.path.getmtime(path))] = core
+
+
+class GridDataCore:
+    """
+    Backend-neutral grid demand data, model output and plot-ready arrays.
+    """
+    @instrumented
+    def __init__(self, grid_file):
+        with span('read_csv'):
+            self.grid = pd.read_csv(grid_file)
+        self.grid['DATE'] = parse_dates(self.grid['SETTLEMENT_DATE'])
+
+        # UTC start of every settlement period, checked against the clock changes.
+        self.timestamps = settlement_timestamps(self.grid['DATE'].values, self.grid['SETTLEMENT_PERIOD'].values)
+        self.grid['TIMESTAMP'] = self.timestamps
+
+        with span('groupby'):
+            self.grid_average = self.grid.groupby('DATE').agg(DEMAND_AVERAGE=pd.NamedAgg('ND',aggfunc=np.mean)).reset_index()
+        self.dates = self.grid_average.DATE.values
+        self.demand = self.grid_average.DEMAND_AVERAGE.values
+
+        table = calendar(self.dates)
+        rows = table.rows(self.dates)
+        self.grid_average['YEAR'] = table.year[rows]
+        self.grid_average['DOY'] = table.doy[rows]
+        doy = table.doy[rows]
+
+        # Get X in years from the beginning, instead of days and transpose. Days are
+        # counted from 1 January of the first year, as the model was trained on.
+        first = table.rows(self.dates[:1].astype('datetime64[Y]'))[0]
+        self.X = np.expand_dims((rows - first + 1)/365, axis=1)
+
+        # Get Y in GW instead of MW and transpose.
+        self.Y = np.expand_dims(self.demand/1000, axis=1)
+
+        # Views of the daily demand for each year, for the collapsed plots.
+        years, starts = np.unique(table.year[rows], return_index=True)
+        ends = np.append(starts[1:], len(doy))
+        self.by_year = [(year, doy[start:end], self.demand[start:end]) for year, start, end in zip(years, starts, ends)]
+
+        self.model_source = None
+        self._profiles = {}
+
+    def profiles(self, column='ND'):
+        """Daily load profiles of a half-hourly column, as a LoadProfiles built once."""
+        if column not in self._profiles:
+            self._profiles[column] = LoadProfiles.from_core(self, column)
+        return self._profiles[column]
+
+    @instrumented
+    def load_model(self, model_file, forecast_limit=7):
+
+        try:
+            import GPy
+        except ModuleNotFoundError:
+            return
+
+        if self.model_source == (model_file, forecast_limit):
+            return
+
+        # Set the datapoint cutoff index for lockdown.
+        self.COVID_CUTOFF = COVID_CUTOFF
+
+        # Set the forecasting limit.
+        self.forecast_limit = forecast_limit
+
+        # Open a pickled model.
+        with open(model_file, 'rb') as f:
+            self.model = pickle.load(f)
+
+        # Predict the model from 0 to the forecasting limit
+        self.X_PREDICT = np.expand_dims(np.linspace(0, self.forecast_limit, 1000), axis=1)
+        self.Y_PREDICT_mean, self.Y_PREDICT_conf = self.model.predict(self.X_PREDICT)
+
+        # Get the datapoints after the lockdown.
+        self.X_COVID = self.X[self.COVID_CUTOFF:]
+        self.Y_COVID = self.Y[self.COVID_CUTOFF:]
+
+        # Predict the datapoints after the lockdown.
+        self.Y_COVID_PREDICT_mean, self.Y_COVID_PREDICT_conf = self.model.predict(self.X_COVID)
+
+        self.model_source = (model_file, forecast_limit)
+        self.prepare_model_arrays()
+
+    @instrumented
+    def load_model_output(self, output_file):
+
+        if self.model_source == output_file:
+            return
+
+        # Set the datapoint cutoff index for lockdown.
+        self.COVID_CUTOFF = COVID_CUTOFF
+        self.forecast_limit = 7
+
+        # Open a pickled model.
+        with open(output_file, 'rb') as f:
+            self.output_dict = pickle.load(f)
+
+        # Predict the model from 0 to the forecasting limit
+        self.X_PREDICT = self.output_dict['X_PREDICT']
+        self.Y_PREDICT_mean, self.Y_PREDICT_conf = self.output_dict['Y_PREDICT_mean'], self.output_dict['Y_PREDICT_conf']
+
+        # Get the datapoints after the lockdown.
+        self.X_COVID = self.output_dict['X_COVID']
+        self.Y_COVID = self.output_dict['Y_COVID']
+
+        # Predict the datapoints after the lockdown.
+        self.Y_COVID_PREDICT_mean, self.Y_COVID_PREDICT_conf = self.output_dict['Y_COVID_PREDICT_mean'], self.output_dict['Y_COVID_PREDICT_conf']
+
+        self.model_source = output_file
+        self.prepare_model_arrays()
+
+    def prepare_model_arrays(self):
+        # Flat arrays of the model prediction and its confidence interval.
+        self.predict_x = self.X_PREDICT.flatten()
+        self.predict_mean = self.Y_PREDICT_mean.flatten()
+        self.predict_low = (self.Y_PREDICT_mean-self.Y_PREDICT_conf).flatten()
+        self.predict_high = (self.Y_PREDICT_mean+self.Y_PREDICT_conf).flatten()
+
+        # True demand relative to the expected demand during lockdown, with confidence limits.
+        y_covid = self.Y_COVID.flatten()
+        mean, conf = self.Y_COVID_PREDICT_mean.flatten(), self.Y_COVID_PREDICT_conf.flatten()
+        self.covid_dates = self.dates[self.COVID_CUTOFF:]
+        self.discrepancy_mean = y_covid/mean
+        self.discrepancy_low = y_covid/(mean+conf)
+        self.discrepancy_high = y_covid/(mean-conf)
+
+
+class GridDataView:
+    """
+    Base class for the plotting front-ends; the data and model output live in a
+    shared GridDataCore and are exposed as attributes of the front-end.
+    """
+    def __init__(self, grid_file):
+        self.core = load_core(grid_file)
+
+    def __getattr__(self, name):
+        if name == 'core':
+            raise AttributeError(name)
+        return getattr(self.core, name)
+
+    def get_data(self):
+        return self.core.grid
+
+    def get_data_average(self):
+        return self.core.grid_average
+
+    def load_model(self, model_file, forecast_limit=7):
+        self.core.load_model(model_file, forecast_limit)
+
+    def load_model_output(self, output_file):
+        self.core.load_model_output(output_file)
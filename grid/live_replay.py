@@ -0,0 +1,158 @@
+"""
+Live replay of grid demand against the streaming counterfactual, as a Bokeh server app.
+
+    bokeh serve grid/live_replay.py --args --speed 96
+    python grid/live_replay.py --speed 96 --port 5006
+
+The DemandCounterfactual is warmed up once per server on the historical
+DemandData files. Each browser session then replays DemandDataUpdate.csv,
+`speed` settlement periods per second: only the new periods are run through the
+model, and only they are sent to the browser with ColumnDataSource.stream, with
+the oldest points rolled over so the page holds at most `window` periods.
+"""
+import os
+import sys
+import copy
+import glob
+import argparse
+
+import pandas as pd
+
+import bokeh.plotting as bkh
+import bokeh.models as bkm
+import bokeh.layouts as bkl
+
+GRID = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(GRID))
+
+from calendar_table import parse_dates, settlement_timestamps
+from grid.counterfactual import DemandCounterfactual, settled
+
+# Two weeks of settlement periods.
+WINDOW = 14*48
+
+# Milliseconds between replay ticks.
+TICK = 200
+
+_warm = {}
+
+
+def timestamps(rows):
+    """UTC start of each settlement period, as naive datetime64 for Bokeh."""
+    # Replayed rows arrive a few periods at a time, so partial days are expected.
+    stamps = settlement_timestamps(parse_dates(rows['SETTLEMENT_DATE']), rows['SETTLEMENT_PERIOD'].values,
+                                   validate=False)
+    return stamps.tz_convert(None).values
+
+
+def warm_model(history_files=None, weather_file=None):
+    """
+    A counterfactual trained on the history, and the last `WINDOW` periods of it.
+
+    The warm-up is the slow part, so it runs once per server and every session
+    starts from a copy. Weather features are only used if a `weather_file` is given.
+    """
+    history_files = tuple(sorted(history_files or glob.glob(os.path.join(GRID, 'DemandData_*.csv'))))
+    key = (history_files, weather_file)
+
+    if key not in _warm:
+        model = DemandCounterfactual(weather_file=weather_file)
+        rows = settled(pd.concat([pd.read_csv(f) for f in history_files], ignore_index=True))
+        effects = model.stream(rows).tail(WINDOW)
+        recent = {'time': timestamps(rows.tail(WINDOW)), 'nd': effects.ND.values,
+                  'expected': effects.EXPECTED.values, 'ratio': effects.RATIO.values}
+        _warm[key] = (model, recent)
+
+    model, recent = _warm[key]
+    return copy.deepcopy(model), recent
+
+
+class Replay:
+    """
+    Replays a DemandData file into a ColumnDataSource, `speed` periods per second.
+    """
+    def __init__(self, update_file=None, speed=48, window=WINDOW, history_files=None, weather_file=None):
+        self.model, recent = warm_model(history_files, weather_file)
+        self.source = bkm.ColumnDataSource(data=recent)
+        self.window = window
+        self.periods_per_tick = speed*TICK/1000
+
+        rows = pd.read_csv(update_file or os.path.join(GRID, 'DemandDataUpdate.csv'))
+        # Periods that haven't been settled yet are published as zero demand.
+        self.rows = settled(rows).reset_index(drop=True)
+        self.position = 0.0
+
+    def tick(self):
+        start = int(self.position)
+        self.position = min(self.position + self.periods_per_tick, len(self.rows))
+        rows = self.rows.iloc[start:int(self.position)]
+        if len(rows) == 0:
+            return
+
+        effects = self.model.stream(rows)
+        self.source.stream({'time': timestamps(rows), 'nd': effects.ND.values,
+                            'expected': effects.EXPECTED.values, 'ratio': effects.RATIO.values},
+                           rollover=self.window)
+
+    @property
+    def finished(self):
+        return self.position >= len(self.rows)
+
+    def layout(self, figsize=(900,300)):
+        demand = bkh.figure(x_axis_type='datetime', plot_width=figsize[0], plot_height=figsize[1])
+        demand.line('time', 'nd', source=self.source, color='black', legend_label='Demand')
+        demand.line('time', 'expected', source=self.source, color='darkturquoise', legend_label='Counterfactual')
+        demand.yaxis.axis_label = 'Demand (MW)'
+        demand.legend.location = 'top_left'
+
+        ratio = bkh.figure(x_axis_type='datetime', x_range=demand.x_range, plot_width=figsize[0], plot_height=figsize[1])
+        ratio.line('time', 'ratio', source=self.source, color='firebrick')
+        ratio.add_layout(bkm.Span(location=1, dimension='width', line_dash='dashed', line_color='gray'))
+        ratio.xaxis.axis_label = 'Date'
+        ratio.yaxis.axis_label = 'Demand/Counterfactual'
+
+        return bkl.column(demand, ratio)
+
+
+def make_document(doc, speed=48, window=WINDOW, update_file=None):
+    replay = Replay(update_file=update_file, speed=speed, window=window)
+    doc.add_root(replay.layout())
+    doc.title = 'Live grid demand replay'
+
+    def tick():
+        replay.tick()
+        if replay.finished:
+            doc.remove_periodic_callback(callback)
+
+    callback = doc.add_periodic_callback(tick, TICK)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description='Replay DemandDataUpdate.csv against the streaming counterfactual.')
+    parser.add_argument('--speed', type=float, default=48, help='settlement periods replayed per second')
+    parser.add_argument('--window', type=int, default=WINDOW, help='periods kept in the browser')
+    parser.add_argument('--update-file', default=None)
+    parser.add_argument('--port', type=int, default=5006)
+    return parser.parse_args(args)
+
+
+def serve(speed=48, window=WINDOW, update_file=None, port=5006):
+    """Run the replay on a standalone Bokeh server and open it in a browser."""
+    from functools import partial
+    from bokeh.server.server import Server
+
+    server = Server({'/': partial(make_document, speed=speed, window=window, update_file=update_file)}, port=port)
+    server.start()
+    server.io_loop.add_callback(server.show, '/')
+    server.io_loop.start()
+
+
+if __name__.startswith('bokeh_app_'):
+    # `bokeh serve` runs this file afresh for every session; go through the
+    # imported module so the warmed-up model is shared between sessions.
+    from grid import live_replay
+    args = parse_args(sys.argv[1:])
+    live_replay.make_document(bkh.curdoc(), speed=args.speed, window=args.window, update_file=args.update_file)
+elif __name__ == '__main__':
+    args = parse_args()
+    serve(args.speed, args.window, args.update_file, args.port)
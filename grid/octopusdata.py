@@ -9,14 +9,136 @@ import datetime
 import bokeh.plotting as bkh
 import bokeh.models as bkm
 
+from instrumentation import instrumented, span
+
+class _Buffer:
+    # Preallocated array that doubles in size when full.
+    def __init__(self, dtype, size=4096):
+        self.values = np.empty(size, dtype=dtype)
+        self.n = 0
+
+    def append(self, value):
+        if self.n == len(self.values):
+            self.values = np.resize(self.values, 2*len(self.values))
+        self.values[self.n] = value
+        self.n += 1
+
+    def extend(self, values):
+        if self.n + len(values) > len(self.values):
+            self.values = np.resize(self.values, max(2*len(self.values), self.n + len(values)))
+        self.values[self.n:self.n+len(values)] = values
+        self.n += len(values)
+
+    def array(self):
+        return self.values[:self.n]
+
+
+def _iter_plotly_events(json_file):
+    """
+    Yield (trace, key, value) for the name, x and y entries of every trace.
+
+    Uses the incremental ijson parser when it is installed, so the file is never
+    held in memory as Python objects, and falls back to the json module otherwise.
+    """
+    try:
+        import ijson
+    except ModuleNotFoundError:
+        ijson = None
+
+    with open(json_file, 'rb') as f:
+        if ijson is None:
+            import json
+            for trace, week in enumerate(json.load(f)['data']):
+                yield trace, 'name', week['name']
+                yield trace, 'x', week['x']
+                yield trace, 'y', week['y']
+            return
+
+        trace = -1
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if prefix == 'data.item' and event == 'start_map':
+                trace += 1
+            elif prefix == 'data.item.name':
+                yield trace, 'name', value
+            elif prefix == 'data.item.x.item':
+                yield trace, 'x_item', value
+            elif prefix == 'data.item.y.item':
+                yield trace, 'y_item', value
+            elif prefix == 'data' and event == 'end_array':
+                # Everything after the traces is layout.
+                return
+
+
+@instrumented
+def read_plotly_lines(json_file, year=2020):
+    """
+    Read one of Octopus's weekly-overlay Plotly line exports in a single pass.
+
+    Each trace is one week, with reverse-ordered timestamps shifted forwards so the
+    weeks overlay each other; the shift is undone using the 'w/c' week name. Returns
+    sorted timestamps and values.
+    """
+    x, y = _Buffer('datetime64[s]'), _Buffer(np.float64)
+    names, starts = {}, [0]
+
+    with span('parse_json'):
+        for trace, key, value in _iter_plotly_events(json_file):
+            if trace == len(starts):
+                starts.append(x.n)
+            if key == 'name':
+                names[trace] = value
+            elif key == 'x_item':
+                x.append(value)
+            elif key == 'y_item':
+                y.append(value)
+            elif key == 'x':
+                x.extend(np.array(value, dtype='datetime64[s]'))
+            else:
+                y.extend(np.array(value, dtype=np.float64))
+    starts.append(x.n)
+
+    # The last timestamp of each trace is the start of its week.
+    timestamps = x.array()
+    for trace, name in names.items():
+        start, end = starts[trace], starts[trace+1]
+        week = np.datetime64(datetime.datetime.strptime('{} {}'.format(name, year), 'w/c %d %b %Y'), 's')
+        timestamps[start:end] -= timestamps[end-1] - week
+
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], y.array()[order]
+
+
+def merge_on_timestamp(series):
+    """Outer-join (timestamps, values) pairs into one table, with NaN where a series has no value."""
+    timestamps = np.unique(np.concatenate([t for t, _ in series.values()]))
+    table = {'Date': timestamps}
+    for name, (t, values) in series.items():
+        column = np.full(len(timestamps), np.nan)
+        column[np.searchsorted(timestamps, t)] = values
+        table[name] = column
+    return pd.DataFrame(table)
+
+
 class OctopusData:
-    def __init__(self, data_file, weather_file=None):
-        self.energy = pd.read_csv(data_file).rename(columns={'Unnamed: 0': 'Date'})
-        self.energy['Date'] = pd.to_datetime(self.energy['Date'], format='%Y-%m-%d %H:%M:%S')
+    @instrumented
+    def __init__(self, data_file=None, weather_file=None, plotly_files=None):
+        """
+        Load half-hourly consumption from an octopus.csv-style `data_file`, or
+        directly from the (electricity, gas) Plotly line exports in `plotly_files`.
+        """
+        if plotly_files:
+            electricity_file, gas_file = plotly_files
+            self.energy = merge_on_timestamp({'Electricity': read_plotly_lines(electricity_file),
+                                              'Gas (corrected)': read_plotly_lines(gas_file)})
+        else:
+            with span('read_csv'):
+                self.energy = pd.read_csv(data_file).rename(columns={'Unnamed: 0': 'Date'})
+            self.energy['Date'] = pd.to_datetime(self.energy['Date'], format='%Y-%m-%d %H:%M:%S')
         self.energy['Date_'] = self.energy.Date.dt.date
         
-        self.energy_average = self.energy.groupby('Date_').agg(electricity_daily_total = pd.NamedAgg('Electricity', 'sum'),
-                                                               gas_daily_total = pd.NamedAgg('Gas (corrected)', 'sum')).reset_index()
+        with span('groupby'):
+            self.energy_average = self.energy.groupby('Date_').agg(electricity_daily_total = pd.NamedAgg('Electricity', 'sum'),
+                                                                   gas_daily_total = pd.NamedAgg('Gas (corrected)', 'sum')).reset_index()
         self.energy_average.drop(self.energy_average.tail(1).index, inplace=True)
         cols = ['electricity_daily_total','gas_daily_total']
         self.energy_average[cols] = self.energy_average[cols].replace({0.0: np.nan})
@@ -33,12 +155,14 @@ class OctopusData:
     def get_data_average(self):
         return self.energy_average
 
+    @instrumented
     def plot_timeline(self, figsize=(24,8)):
         ax = self.energy.plot('Date', ['Electricity', 'Gas (corrected)'], figsize=figsize)
         ax.set_ylabel('kWh')
         plt.show()
         
-    def plot_timeline_bkh(self, figsize=(600,300)):
+    @instrumented
+    def plot_timeline_bkh(self, figsize=(600,300), show=True):
         p = bkh.figure(x_axis_type='datetime', plot_width=figsize[0], plot_height=figsize[1])
         
         p.line(x=self.energy['Date'],
@@ -52,8 +176,12 @@ class OctopusData:
         p.xaxis[0].formatter = bkm.DatetimeTickFormatter(days=['%d/%m'])
 
         #bkh.output_notebook()
-        bkh.show(p)
+        if not show:
+            return p
+        with span('bokeh.show'):
+            bkh.show(p)
 
+    @instrumented
     def plot_daily_electricity(self, figsize=(24,8), plot_temperature=False, colors=['k', 'darkturquoise']):
         locator = mdates.AutoDateLocator(minticks=6, maxticks=12)
         formatter = mdates.ConciseDateFormatter(locator)
@@ -86,7 +214,8 @@ class OctopusData:
         fig.tight_layout()
         plt.show()
         
-    def plot_daily_electricity_bkh(self, figsize=(650,450), plot_temperature=False, colors=['black', 'darkturquoise']):
+    @instrumented
+    def plot_daily_electricity_bkh(self, figsize=(650,450), plot_temperature=False, colors=['black', 'darkturquoise'], show=True):
         p = bkh.figure(x_axis_type='datetime', plot_width=figsize[0], plot_height=figsize[1])
 
         p.line(x=self.energy_average['Date_'], y=12*np.ones(len(self.energy_average)), line_dash='dashed', line_color=colors[0], legend_label='Typical domestic use')
@@ -119,8 +248,12 @@ class OctopusData:
             p.legend.background_fill_alpha = 1.0
             
         #bkh.output_notebook()
-        bkh.show(p)
+        if not show:
+            return p
+        with span('bokeh.show'):
+            bkh.show(p)
         
+    @instrumented
     def plot_daily_gas(self, figsize=(24,8), plot_temperature=False, colors=['k', 'darkturquoise']):
         locator = mdates.AutoDateLocator(minticks=6, maxticks=12)
         formatter = mdates.ConciseDateFormatter(locator)
@@ -153,7 +286,8 @@ class OctopusData:
         fig.tight_layout()
         plt.show()
 
-    def plot_daily_gas_bkh(self, figsize=(650,450), plot_temperature=False, colors=['black', 'darkturquoise']):
+    @instrumented
+    def plot_daily_gas_bkh(self, figsize=(650,450), plot_temperature=False, colors=['black', 'darkturquoise'], show=True):
         p = bkh.figure(x_axis_type='datetime', plot_width=figsize[0], plot_height=figsize[1])
 
         p.line(x=self.energy_average['Date_'], y=32*np.ones(len(self.energy_average)), line_dash='dashed', line_color=colors[0], legend_label='Typical domestic use (medium)')
@@ -186,4 +320,7 @@ class OctopusData:
             p.legend.background_fill_alpha = 1.0
             
         #bkh.output_notebook()
-        bkh.show(p)
+        if not show:
+            return p
+        with span('bokeh.show'):
+            bkh.show(p)
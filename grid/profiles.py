@@ -0,0 +1,297 @@
+"""
+Daily load profiles: the shape of each day's demand over its settlement periods.
+
+GridData averages each day to one number; here every day keeps its 48 half-hour
+values as one row of a (days, 48) matrix, so the loss of the morning peak under
+lockdown shows up as a change of shape. Columns are local clock half-hours. On
+the 46-period spring clock-change day the missing hour is NaN, and on the
+50-period autumn day the repeated hour is averaged.
+
+Days are clustered on their shape (each profile divided by its mean) with a
+masked k-means that is a few matrix products per iteration, and each cluster is
+labelled weekday-like, weekend-like or lockdown-like by the kind of day (working
+day, day off or lockdown day) it holds most of relative to that kind's share of
+the whole history. Lockdown days are only a few percent of the history, so a
+majority vote would never call a cluster lockdown-like. The mix of kinds in each
+cluster is reported with its centroid:
+
+    profiles = grid_data.core.profiles()
+    days, centroids = profiles.cluster(n_clusters=6)
+    scores, components, explained = profiles.pca()
+
+For regional files with many more rows, `cluster(batch_size=...)` fits with
+mini-batch updates (ProfileKMeans.partial_fit) instead. Periods not yet settled
+(published with ND = 0) are missing, and days with too few settled periods are
+left out. `python -m grid.profiles`, run from the repository root, clusters the
+shipped files and checks that most lockdown days come out lockdown-like.
+"""
+import os
+import glob
+
+import numpy as np
+import pandas as pd
+
+from calendar_table import calendar, parse_dates
+
+from instrumentation import instrumented, span
+
+PERIODS = 48
+LOCKDOWN_START = '2020-03-23'
+LABELS = ['weekday-like', 'weekend-like', 'lockdown-like']
+KINDS = ['working day', 'day off', 'lockdown']
+# A cluster needs this many days of a kind to be labelled by it.
+MIN_LABEL_DAYS = 5
+# Share of lockdown days that check_lockdown expects to be labelled lockdown-like.
+LOCKDOWN_SHARE = 0.5
+SLOTS = ['{:02d}:{:02d}'.format(slot // 2, 30*(slot % 2)) for slot in range(PERIODS)]
+
+
+def clock_slots(periods, settlement_periods):
+    """
+    Local clock half-hour (0-47) of each settlement period, given the number of
+    periods in its day. 46-period days skip 01:00-02:00 (periods 3 onwards start
+    at 02:00), and on 50-period days periods 5 and 6 repeat 01:00-02:00.
+    """
+    periods = np.asarray(periods, dtype=np.int64)
+    return periods - 1 + 2*((settlement_periods == 46) & (periods > 2)) - 2*((settlement_periods == 50) & (periods > 4))
+
+
+def daily_profiles(dates, periods, values):
+    """
+    (days, profiles) for half-hourly rows: the sorted unique dates and a (days, 48)
+    float matrix of the values by local clock half-hour, NaN where a day has none
+    (missing values may also be given as NaN).
+
+    When every day has its 48 periods in order, the matrix is a reshape (a view)
+    of the float64 values rather than a scatter. Other dtypes, like the integer
+    ND column, are converted to float64 first, which copies them once.
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    periods = np.asarray(periods)
+    values = np.asarray(values, dtype=np.float64)
+
+    if len(values) % PERIODS == 0 and len(values):
+        blocks = dates.reshape(-1, PERIODS)
+        if ((periods.reshape(-1, PERIODS) == np.arange(1, PERIODS + 1)).all()
+                and (blocks == blocks[:, :1]).all() and (np.diff(blocks[:, 0]) > np.timedelta64(0, 'D')).all()):
+            return blocks[:, 0], values.reshape(-1, PERIODS)
+
+    days, day = np.unique(dates, return_inverse=True)
+    table = calendar(days)
+    slots = clock_slots(periods, table.settlement_periods[table.rows(days)][day])
+    flat = day*PERIODS + slots
+    observed = ~np.isnan(values)
+    sums = np.bincount(flat, weights=np.where(observed, values, 0), minlength=len(days)*PERIODS)
+    counts = np.bincount(flat, weights=observed, minlength=len(days)*PERIODS)
+    with np.errstate(invalid='ignore'):
+        return days, (sums/counts).reshape(-1, PERIODS)
+
+
+def pca(profiles, n_components=3):
+    """
+    Principal components of a (days, slots) matrix, with missing values filled by
+    their column mean. Returns (scores, components, explained variance ratio).
+    """
+    filled = np.where(np.isnan(profiles), np.nanmean(profiles, axis=0), profiles)
+    centred = filled - filled.mean(axis=0)
+    u, s, vt = np.linalg.svd(centred, full_matrices=False)
+    explained = s**2/(s**2).sum()
+    return u[:, :n_components]*s[:n_components], vt[:n_components], explained[:n_components]
+
+
+def label_clusters(counts, min_days=MIN_LABEL_DAYS):
+    """
+    LABELS entry of each cluster from its (clusters, kinds) day counts: the kind
+    most over-represented in it relative to that kind's share of all days, among
+    the kinds it has at least `min_days` of. Clusters with no such kind take
+    their most common kind, and empty clusters get None.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    sizes = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        enrichment = (counts/sizes)/(counts.sum(axis=0)/counts.sum())
+    enrichment = np.where(counts >= min_days, np.nan_to_num(enrichment), -np.inf)
+    best = np.where(np.isfinite(enrichment).any(axis=1), np.argmax(enrichment, axis=1), np.argmax(counts, axis=1))
+    return np.where(sizes[:, 0] > 0, np.array(LABELS)[best], None)
+
+
+def check_lockdown(days, share=LOCKDOWN_SHARE):
+    """
+    Raise a ValueError if fewer than `share` of the lockdown days in a cluster()
+    days table are labelled lockdown-like. Returns the share that are.
+    """
+    lockdown = days[days.kind == KINDS[2]]
+    found = (lockdown.label == LABELS[2]).mean() if len(lockdown) else 1.0
+    if found < share:
+        raise ValueError('{:.0%} of {} lockdown days are labelled {}, fewer than {:.0%}'.format(
+            found, len(lockdown), LABELS[2], share))
+    return found
+
+
+class ProfileKMeans:
+    """
+    k-means on rows with missing (NaN) entries, which take no part in distances or
+    centroids. Distances are mean squared differences over each row's observed
+    entries, so rows with a masked hour are not favoured.
+
+    `fit` runs Lloyd iterations over all rows; `partial_fit` updates the centroids
+    from one batch at a time, each centroid entry being the running mean of the
+    rows assigned to it, so it can continue from `fit` or start from scratch.
+    """
+    def __init__(self, n_clusters=6, seed=0):
+        self.n_clusters = n_clusters
+        self.rng = np.random.default_rng(seed)
+        self.centroids = None
+        self.counts = None
+
+    @staticmethod
+    def _masked(X):
+        observed = ~np.isnan(X)
+        return np.where(observed, X, 0), observed.astype(np.float64)
+
+    def _initialise(self, X):
+        """k-means++ seeding from the complete rows."""
+        complete = X[~np.isnan(X).any(axis=1)]
+        centroids = [complete[self.rng.integers(len(complete))]]
+        distance = ((complete - centroids[0])**2).sum(axis=1)
+        for _ in range(1, self.n_clusters):
+            centroids.append(complete[self.rng.choice(len(complete), p=distance/distance.sum())])
+            distance = np.minimum(distance, ((complete - centroids[-1])**2).sum(axis=1))
+        self.centroids = np.array(centroids)
+        self.counts = np.zeros_like(self.centroids)
+
+    def distances(self, X):
+        """(rows, clusters) mean squared distance over each row's observed entries."""
+        X0, W = self._masked(X)
+        squared = (X0**2).sum(axis=1)[:, None] - 2*X0 @ self.centroids.T + W @ (self.centroids**2).T
+        return np.maximum(squared, 0)/np.maximum(W.sum(axis=1), 1)[:, None]
+
+    def predict(self, X):
+        return np.argmin(self.distances(X), axis=1)
+
+    def _sums(self, X, labels):
+        X0, W = self._masked(X)
+        assigned = (labels[:, None] == np.arange(self.n_clusters)).astype(np.float64)
+        return assigned.T @ X0, assigned.T @ W
+
+    @instrumented
+    def fit(self, X, n_iter=100):
+        if self.centroids is None:
+            self._initialise(X)
+        labels = None
+        with span('kmeans.lloyd'):
+            for _ in range(n_iter):
+                new = self.predict(X)
+                if labels is not None and (new == labels).all():
+                    break
+                labels = new
+                sums, weights = self._sums(X, labels)
+                # Empty clusters (and unobserved entries) keep their previous centroid.
+                self.centroids = np.where(weights > 0, sums/np.maximum(weights, 1), self.centroids)
+        # Counts for partial_fit to carry on from, also when n_iter is 0.
+        self.counts = self._sums(X, self.predict(X))[1]
+        return self
+
+    def partial_fit(self, X):
+        if self.centroids is None:
+            self._initialise(X)
+        sums, weights = self._sums(X, self.predict(X))
+        self.counts = self.counts + weights
+        self.centroids = self.centroids + (sums - weights*self.centroids)/np.maximum(self.counts, 1)
+        return self
+
+
+class LoadProfiles:
+    """
+    The (days, 48) profile matrix of one column of a set of DemandData rows, with
+    the calendar of each day.
+
+    Rows not yet settled (ND = 0) are missing, and days with fewer than
+    `min_periods` settled half-hours are dropped, since their mean, and so their
+    shape, would only cover part of the day.
+    """
+    @instrumented
+    def __init__(self, rows, column='ND', min_periods=44):
+        dates = parse_dates(rows['SETTLEMENT_DATE'])
+        self.column = column
+        values = np.where(rows['ND'].values > 0, rows[column].values, np.nan)
+        days, profiles = daily_profiles(dates, rows['SETTLEMENT_PERIOD'].values, values)
+
+        complete = (~np.isnan(profiles)).sum(axis=1) >= min_periods
+        self.days, self.profiles = days[complete], profiles[complete]
+
+        table = calendar(self.days)
+        day_rows = table.rows(self.days)
+        self.weekday = table.weekday[day_rows]
+        self.day_off = table.is_weekend[day_rows] | table.bank_holiday[day_rows]
+
+    @classmethod
+    def from_core(cls, core, column='ND'):
+        """Profiles of the half-hourly rows of a GridDataCore."""
+        return cls(core.grid, column)
+
+    def mean(self):
+        return np.nanmean(self.profiles, axis=1)
+
+    def shapes(self):
+        """Each day's profile divided by its mean, so days compare on shape not level."""
+        return self.profiles/self.mean()[:, None]
+
+    def pca(self, n_components=3):
+        return pca(self.shapes(), n_components)
+
+    def kinds(self, lockdown=LOCKDOWN_START):
+        """Index into KINDS of each day: working day, day off, or in lockdown."""
+        return np.where(self.days >= np.datetime64(lockdown, 'D'), 2, self.day_off.astype(np.int64))
+
+    @instrumented
+    def cluster(self, n_clusters=6, lockdown=LOCKDOWN_START, seed=0, n_iter=100, batch_size=None, epochs=5,
+                min_days=MIN_LABEL_DAYS):
+        """
+        Cluster the daily shapes and label each cluster with label_clusters: by
+        the kind of day it is most over-represented in relative to that kind's
+        share overall, counting only kinds it has at least `min_days` of.
+
+        With a `batch_size` the centroids are fitted by mini-batch updates over
+        `epochs` shuffled passes. Returns (days, centroids): a DataFrame of each
+        day's cluster, label, kind and mean, and one of each cluster's centroid
+        shape with its label, number of days and number of days of each kind.
+        """
+        shapes = self.shapes()
+        model = ProfileKMeans(n_clusters, seed)
+        if batch_size is None:
+            model.fit(shapes, n_iter)
+        else:
+            with span('kmeans.minibatch'):
+                for _ in range(epochs):
+                    order = model.rng.permutation(len(shapes))
+                    for start in range(0, len(order), batch_size):
+                        model.partial_fit(shapes[order[start:start + batch_size]])
+        clusters = model.predict(shapes)
+
+        kinds = self.kinds(lockdown)
+        counts = np.zeros((n_clusters, len(KINDS)), dtype=np.int64)
+        np.add.at(counts, (clusters, kinds), 1)
+        cluster_labels = label_clusters(counts, min_days)
+
+        days = pd.DataFrame({'date': self.days, 'cluster': clusters, 'label': cluster_labels[clusters],
+                             'kind': np.array(KINDS)[kinds], 'mean': self.mean()})
+        centroids = pd.DataFrame(model.centroids, columns=SLOTS)
+        centroids['label'] = cluster_labels
+        centroids['days'] = counts.sum(axis=1)
+        for i, kind in enumerate(KINDS):
+            centroids[kind] = counts[:, i]
+        return days, centroids
+
+
+if __name__ == '__main__':
+    grid = os.path.dirname(os.path.abspath(__file__))
+    files = sorted(glob.glob(os.path.join(grid, 'DemandData_*.csv'))) + [os.path.join(grid, 'DemandDataUpdate.csv')]
+    rows = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
+    rows = rows.drop_duplicates(['SETTLEMENT_DATE', 'SETTLEMENT_PERIOD'], keep='last')
+    profiles = LoadProfiles(rows)
+    for n_clusters in (6, 8, 10):
+        for batch_size in (None, 128):
+            days, centroids = profiles.cluster(n_clusters, batch_size=batch_size)
+            print('k={} batch_size={}: {:.0%} of lockdown days lockdown-like'.format(
+                n_clusters, batch_size, check_lockdown(days)))
@@ -0,0 +1,166 @@
+"""
+Opt-in timing and peak-memory instrumentation for the data classes.
+
+Profiling is switched on either for a whole session by setting the
+CORONASAURUS_PROFILE environment variable (to a report path, or to 1 for a
+timestamped file), or for a block of code:
+
+    with profile_session('profile.json'):
+        grid_data = GridData('./grid/combined.csv')
+
+The report is written in Chrome trace-event format, which chrome://tracing,
+Perfetto and speedscope all open as a flame graph, plus a per-span summary.
+When no session is active `instrumented` and `span` do almost nothing.
+
+Every data module imports them from here, so the repository root has to be on
+sys.path; the notebooks in the subdirectories add it in their import cell.
+"""
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+import contextlib
+import tracemalloc
+
+ENVIRONMENT_VARIABLE = 'CORONASAURUS_PROFILE'
+
+_session = None
+_null_span = contextlib.nullcontext()
+
+
+class _Span:
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+        self.memory_start = 0
+        self.peak = 0
+
+    def __enter__(self):
+        self.session.enter(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.session.exit(self)
+        return False
+
+
+class ProfileSession:
+    def __init__(self, report_file=None, memory=True):
+        self.report_file = report_file or time.strftime('profile_%Y%m%d_%H%M%S.json')
+        self.memory = memory
+        self.events = []
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        return self
+
+    def stop(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        self.write()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def enter(self, span):
+        stack = self._stack()
+        if self.memory and tracemalloc.is_tracing():
+            # Bank the parent's peak before resetting it, so every span sees its own peak.
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            span.memory_start, span.peak = current, current
+        stack.append(span)
+        span.start = time.perf_counter()
+
+    def exit(self, span):
+        end = time.perf_counter()
+        stack = self._stack()
+        stack.pop()
+
+        args = {}
+        if self.memory and tracemalloc.is_tracing():
+            peak = max(span.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            args['peak_memory_bytes'] = peak - span.memory_start
+
+        with self._lock:
+            self.events.append({'name': span.name, 'ph': 'X', 'pid': os.getpid(),
+                                'tid': threading.get_ident(),
+                                'ts': (span.start - self.origin)*1e6,
+                                'dur': (end - span.start)*1e6, 'args': args})
+
+    def summary(self):
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event['name'], {'calls': 0, 'total_seconds': 0.0, 'peak_memory_bytes': 0})
+            total['calls'] += 1
+            total['total_seconds'] += event['dur']/1e6
+            total['peak_memory_bytes'] = max(total['peak_memory_bytes'], event['args'].get('peak_memory_bytes', 0))
+        return dict(sorted(totals.items(), key=lambda item: -item[1]['total_seconds']))
+
+    def write(self):
+        with self._lock:
+            report = {'traceEvents': list(self.events), 'displayTimeUnit': 'ms', 'summary': self.summary()}
+        with open(self.report_file, 'w') as f:
+            json.dump(report, f, indent=1)
+        return self.report_file
+
+
+def span(name):
+    """Time (and measure the peak memory of) a block of code when profiling is on."""
+    if _session is None:
+        return _null_span
+    return _Span(_session, name)
+
+
+def instrumented(func):
+    """Decorator wrapping a function or method in a span named after it."""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _session is None:
+            return func(*args, **kwargs)
+        with _Span(_session, name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def profile_session(report_file=None, memory=True):
+    """Profile everything run inside the block and write the report on exit."""
+    global _session
+    previous = _session
+    _session = ProfileSession(report_file, memory).start()
+    try:
+        yield _session
+    finally:
+        session, _session = _session, previous
+        session.stop()
+
+
+def _start_from_environment():
+    global _session
+    value = os.environ.get(ENVIRONMENT_VARIABLE, '')
+    if value and value != '0':
+        _session = ProfileSession(None if value == '1' else value).start()
+        atexit.register(_session.stop)
+
+
+_start_from_environment()
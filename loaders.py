@@ -0,0 +1,92 @@
+"""
+Load every dataset used by coronasaurus.ipynb concurrently.
+
+    datasets = load_all()
+    grid_data = datasets['grid']
+    grid_data.plot_demand_bkh()   # waits for the grid data only if it is still loading
+
+Each loader runs on a thread pool, except the CPU-heavy grid aggregation which
+runs in a separate process. The handles returned can be used in place of the
+loaded objects, so the first cells render while the large files are still being
+read, and total start-up time approaches that of the slowest single loader.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from Emissions import emissionsdata
+from transport.Transport import Traffic
+from grid import griddata_core, griddata_bkh, octopusdata
+from society import societydata
+from covid import coronadata
+from timeline import timeline
+from fuel.fueldata import FuelData
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class Handle:
+    """
+    Stand-in for an object that is loading in the background.
+
+    Attribute access (including method calls) waits for the load to finish and is
+    forwarded to the loaded object; `result()` returns the object itself.
+    """
+    def __init__(self, future):
+        self._future = future
+
+    def result(self, timeout=None):
+        return self._future.result(timeout)
+
+    def done(self):
+        return self._future.done()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._future.result(), name)
+
+    def __repr__(self):
+        state = 'loaded' if self._future.done() else 'loading'
+        return '<Handle ({})>'.format(state)
+
+
+def _grid_front_end(grid_file, core):
+    # Add the core built in the worker process to the cache so the front-end reuses it.
+    griddata_core.register_core(grid_file, core.result())
+    return griddata_bkh.GridData(grid_file)
+
+
+def load_all(root=ROOT, processes=True, max_workers=None):
+    """
+    Start loading all the datasets and return a dictionary of handles to them.
+    """
+    path = lambda *parts: os.path.join(root, *parts)
+    grid_file = path('grid', 'combined.csv')
+
+    # Start the process pool before any threads, so forked workers don't inherit them.
+    if processes:
+        process_pool = ProcessPoolExecutor(max_workers=1)
+        grid_core = process_pool.submit(griddata_core.GridDataCore, os.path.abspath(grid_file))
+        process_pool.shutdown(wait=False)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    loaders = {
+        'emissions': lambda: emissionsdata.Emissions(country_co2=path('Emissions', 'CO2EmissionsByCountry.csv'),
+                                                     global_co2=path('Emissions', 'GlobalDailyCO2.csv'),
+                                                     sector_co2=path('Emissions', 'globalemissions_sector.csv')),
+        'traffic': lambda: Traffic(transport_file=path('transport', 'UK_transport.csv'),
+                                   weather_file=path('transport', 'UK_weather.csv'),
+                                   results_file=path('transport', 'Model_summaries', 'model_results.sqlite')),
+        'grid': (lambda: _grid_front_end(grid_file, grid_core)) if processes else (lambda: griddata_bkh.GridData(grid_file)),
+        'octopus': lambda: octopusdata.OctopusData(data_file=path('grid', 'octopus', 'octopus.csv'),
+                                                   weather_file=path('grid', 'octopus', 'UK_weather.csv')),
+        'society': lambda: societydata.Society(wellness=path('society', 'london_cv19_wellness.csv'),
+                                               happiness=path('society', 'ons_happiness.csv')),
+        'corona': lambda: coronadata.CoronaData(path('covid', 'cases_england.csv'), path('covid', 'deaths.csv')),
+        'timeline': lambda: timeline.TimelineData(path('timeline', 'uk_cv19_timeline_utf8.csv')),
+        'fuel': lambda: FuelData(path('fuel', 'fuel_prices.csv')),
+    }
+    handles = {name: Handle(pool.submit(loader)) for name, loader in loaders.items()}
+    pool.shutdown(wait=False)
+
+    return handles
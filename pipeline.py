@@ -0,0 +1,319 @@
+"""
+Dependency-aware runner for the analysis in coronasaurus.ipynb, with cached stages.
+
+    python pipeline.py                  # run everything, reusing cached stages
+    python pipeline.py figures_traffic  # run one stage and what it depends on
+    python pipeline.py --list
+
+Each stage declares the files it reads, the stages it depends on and the files
+it writes, and the source files of the code it runs. A stage's key is a hash of
+its own function, the contents of its input and code files and the keys of its
+dependencies, and its result is pickled under that key in `.pipeline_cache/`.
+Editing transport/UK_weather.csv or transport/Transport.py therefore only reruns
+the transport stages and the figures drawn from them. Independent stages run in
+parallel on a process pool.
+"""
+import os
+import sys
+import glob
+import pickle
+import inspect
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_digests = {}
+
+
+def file_digest(path):
+    """sha256 of a file's contents, remembered while the file is unchanged."""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+class Stage:
+    def __init__(self, name, func, inputs=None, outputs=None, depends=(), code=()):
+        self.name = name
+        self.func = func
+        self.inputs = inputs or {}
+        self.outputs = outputs or {}
+        self.depends = list(depends)
+        self.code = list(code)
+
+    def key(self, root, dependency_keys):
+        digest = hashlib.sha256(self.name.encode())
+        digest.update(inspect.getsource(self.func).encode())
+        for argument, path in sorted(self.inputs.items()):
+            digest.update('{}={}'.format(argument, file_digest(os.path.join(root, path))).encode())
+        for path in sorted(self.code):
+            digest.update('{}:{}'.format(path, file_digest(os.path.join(root, path))).encode())
+        for dependency in self.depends:
+            digest.update(dependency_keys[dependency].encode())
+        for argument, path in sorted(self.outputs.items()):
+            digest.update('{}>{}'.format(argument, path).encode())
+        return digest.hexdigest()
+
+
+def _run_stage(func, kwargs, cache_file):
+    # Runs in a worker; the result is written to the cache there so only the
+    # parent's copy has to cross the process boundary.
+    result = func(**kwargs)
+    with open(cache_file + '.tmp', 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(cache_file + '.tmp', cache_file)
+    return result
+
+
+class Pipeline:
+    """
+    A set of stages, run in dependency order with their results cached on disk.
+
+    Stage functions are called with their dependencies' results and the absolute
+    paths of their inputs and outputs as keyword arguments.
+    """
+    def __init__(self, root=ROOT, cache_dir=None):
+        self.root = root
+        self.cache_dir = cache_dir or os.path.join(root, '.pipeline_cache')
+        self.stages = {}
+        self.errors = {}
+
+    def stage(self, inputs=None, outputs=None, depends=(), code=(), name=None):
+        """
+        Decorator registering a function as a stage. `code` lists the source files
+        (relative to the root) of the modules the stage runs, so editing them
+        invalidates its cache.
+        """
+        def register(func):
+            stage_name = name or func.__name__
+            missing = [d for d in depends if d not in self.stages]
+            if missing:
+                raise ValueError('{} depends on unknown stages {}'.format(stage_name, missing))
+            self.stages[stage_name] = Stage(stage_name, func, inputs, outputs, depends, code)
+            return func
+        return register
+
+    def order(self, targets=None):
+        """Stages needed for `targets` (default all), dependencies first."""
+        order = []
+
+        def visit(name):
+            if name not in order:
+                for dependency in self.stages[name].depends:
+                    visit(dependency)
+                order.append(name)
+
+        for name in targets or self.stages:
+            if name not in self.stages:
+                raise KeyError('Unknown stage {}'.format(name))
+            visit(name)
+        return order
+
+    def cache_file(self, name, key):
+        return os.path.join(self.cache_dir, '{}-{}.pkl'.format(name, key[:16]))
+
+    def is_cached(self, stage, key):
+        return (os.path.exists(self.cache_file(stage.name, key))
+                and all(os.path.exists(os.path.join(self.root, path)) for path in stage.outputs.values()))
+
+    def run(self, targets=None, processes=True, max_workers=None, verbose=True):
+        """
+        Run `targets` and their dependencies, returning a dictionary of stage results.
+
+        Stages whose key is already cached are loaded rather than run. A stage that
+        fails is recorded in `errors` and the stages depending on it are skipped.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        log = print if verbose else (lambda *args: None)
+
+        pending = self.order(targets)
+        keys, results, running = {}, {}, {}
+        self.errors = {}
+
+        Executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with Executor(max_workers=max_workers) as pool:
+            while pending or running:
+                for name in list(pending):
+                    stage = self.stages[name]
+                    if any(d in self.errors for d in stage.depends):
+                        self.errors[name] = 'skipped: a dependency failed'
+                        pending.remove(name)
+                        continue
+                    if not all(d in results for d in stage.depends):
+                        continue
+
+                    pending.remove(name)
+                    try:
+                        keys[name] = stage.key(self.root, keys)
+                    except OSError as error:
+                        self.errors[name] = error
+                        log('{:<28} failed: {}'.format(name, error))
+                        continue
+
+                    cache_file = self.cache_file(name, keys[name])
+                    if self.is_cached(stage, keys[name]):
+                        with open(cache_file, 'rb') as f:
+                            results[name] = pickle.load(f)
+                        log('{:<28} cached'.format(name))
+                        continue
+
+                    for stale in glob.glob(self.cache_file(name, '*')):
+                        os.remove(stale)
+                    for path in stage.outputs.values():
+                        os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+
+                    kwargs = {d: results[d] for d in stage.depends}
+                    kwargs.update({a: os.path.join(self.root, p) for a, p in {**stage.inputs, **stage.outputs}.items()})
+                    running[pool.submit(_run_stage, stage.func, kwargs, cache_file)] = name
+                    log('{:<28} running'.format(name))
+
+                if not running:
+                    # Everything left was loaded from the cache or skipped.
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                        log('{:<28} done'.format(name))
+                    except Exception as error:
+                        self.errors[name] = error
+                        log('{:<28} failed: {!r}'.format(name, error))
+
+        return results
+
+
+def save_bokeh(figure, file_name, title):
+    from bokeh.io import save
+    from bokeh.resources import CDN
+    save(figure, filename=file_name, resources=CDN, title=title)
+    return file_name
+
+
+# Source files of the modules each group of stages runs.
+GRID_CODE = ['calendar_table.py', 'grid/griddata_core.py', 'grid/profiles.py']
+TRAFFIC_CODE = ['calendar_table.py', 'transport/Transport.py', 'transport/results_store.py', 'transport/crossval.py']
+OCTOPUS_CODE = ['grid/octopusdata.py']
+EMISSIONS_CODE = ['Emissions/emissionsdata.py', 'Emissions/countries.py', 'Emissions/sectors.py',
+                  'Emissions/uncertainty.py']
+
+pipeline = Pipeline()
+
+
+@pipeline.stage(inputs={'grid_file': 'grid/combined.csv'}, code=GRID_CODE)
+def grid_core(grid_file):
+    from grid.griddata_core import GridDataCore
+    return GridDataCore(grid_file)
+
+
+@pipeline.stage(inputs={'output_file': 'grid/model_output.p'}, depends=['grid_core'], code=GRID_CODE)
+def grid_model(grid_core, output_file):
+    grid_core.load_model_output(output_file)
+    return grid_core
+
+
+@pipeline.stage(inputs={'transport_file': 'transport/UK_transport.csv', 'weather_file': 'transport/UK_weather.csv'},
+                code=TRAFFIC_CODE)
+def traffic(transport_file, weather_file):
+    from transport.Transport import Traffic
+    # Fits are shared with the later stages (and runs) through the results store.
+    return Traffic(transport_file=transport_file, weather_file=weather_file,
+                   results_file=os.path.join(pipeline.cache_dir, 'model_results.sqlite'))
+
+
+@pipeline.stage(depends=['traffic'], code=TRAFFIC_CODE)
+def traffic_immediate_effects(traffic):
+    return traffic.estimate_effects(immediate=True)
+
+
+@pipeline.stage(depends=['traffic'], code=TRAFFIC_CODE)
+def traffic_daily_effects(traffic):
+    return traffic.estimate_effects(immediate=False)
+
+
+@pipeline.stage(inputs={'data_file': 'grid/octopus/octopus.csv', 'weather_file': 'grid/octopus/UK_weather.csv'},
+                code=OCTOPUS_CODE)
+def octopus(data_file, weather_file):
+    from grid.octopusdata import OctopusData
+    return OctopusData(data_file=data_file, weather_file=weather_file)
+
+
+@pipeline.stage(inputs={'country_co2': 'Emissions/CO2EmissionsByCountry.csv', 'global_co2': 'Emissions/GlobalDailyCO2.csv',
+                        'sector_co2': 'Emissions/globalemissions_sector.csv'}, code=EMISSIONS_CODE)
+def emissions(country_co2, global_co2, sector_co2):
+    from Emissions.emissionsdata import Emissions
+    return Emissions(country_co2=country_co2, global_co2=global_co2, sector_co2=sector_co2)
+
+
+@pipeline.stage(inputs={'grid_file': 'grid/combined.csv'}, depends=['grid_model'],
+                outputs={'demand': 'figures/grid_demand.html', 'discrepancy': 'figures/grid_discrepancy.html'},
+                code=GRID_CODE + ['grid/griddata_bkh.py'])
+def figures_grid(grid_model, grid_file, demand, discrepancy):
+    from grid import griddata_core, griddata_bkh
+    griddata_core.register_core(grid_file, grid_model)
+    grid_data = griddata_bkh.GridData(grid_file)
+    return [save_bokeh(grid_data.plot_demand_bkh(show=False), demand, 'Grid demand'),
+            save_bokeh(grid_data.plot_demand_discrepancy_bkh(show=False), discrepancy, 'Grid demand discrepancy')]
+
+
+@pipeline.stage(depends=['octopus'], outputs={'electricity': 'figures/octopus_electricity.html',
+                                              'gas': 'figures/octopus_gas.html'}, code=OCTOPUS_CODE)
+def figures_octopus(octopus, electricity, gas):
+    return [save_bokeh(octopus.plot_daily_electricity_bkh(plot_temperature=True, show=False), electricity, 'Electricity'),
+            save_bokeh(octopus.plot_daily_gas_bkh(plot_temperature=True, show=False), gas, 'Gas')]
+
+
+@pipeline.stage(depends=['emissions'], outputs={'uk': 'figures/emissions_uk.html', 'global_': 'figures/emissions_global.html',
+                                                'sector': 'figures/emissions_sector.html'},
+                code=EMISSIONS_CODE)
+def figures_emissions(emissions, uk, global_, sector):
+    return [save_bokeh(emissions.plot_uk_daily(show=False), uk, 'UK emissions'),
+            save_bokeh(emissions.plot_global_daily(show=False), global_, 'Global emissions'),
+            save_bokeh(emissions.plot_sector(show=False), sector, 'Emissions by sector')]
+
+
+@pipeline.stage(depends=['traffic', 'traffic_immediate_effects', 'traffic_daily_effects'],
+                outputs={'timeline': 'figures/transport/transport_timeline.png',
+                         'parameters': 'figures/transport/interrupted_linear_model_parameters.png'},
+                code=TRAFFIC_CODE)
+def figures_traffic(traffic, traffic_immediate_effects, traffic_daily_effects, timeline, parameters):
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+    # Traffic saves its figures under fixed names in its figures directory.
+    figures_directory = os.path.dirname(parameters) + os.sep
+    traffic.set_output_directories(figures_directory, figures_directory, figures_directory)
+    traffic.plot_transport_data(save=True)
+    traffic.run_interrupted_LM(save=True)
+    return [timeline, parameters]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the analysis pipeline, reusing cached stages.')
+    parser.add_argument('targets', nargs='*', help='stages to run (default: all)')
+    parser.add_argument('--threads', action='store_true', help='run stages on threads instead of processes')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--list', action='store_true', help='list the stages and their dependencies')
+    args = parser.parse_args()
+
+    if args.list:
+        for name in pipeline.order():
+            stage = pipeline.stages[name]
+            print('{:<28} <- {}'.format(name, ', '.join(stage.depends + list(stage.inputs.values())) or '-'))
+        return
+
+    pipeline.run(args.targets or None, processes=not args.threads, max_workers=args.workers)
+    if pipeline.errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
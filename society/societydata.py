@@ -2,10 +2,18 @@ import bokeh.plotting as bkh
 import bokeh.models as bkm
 import pandas as pd
 
+from instrumentation import instrumented, span
+
+try:
+    from .commuting import simulate, SCENARIOS
+except ImportError:
+    from commuting import simulate, SCENARIOS
+
 class Society():
     """
     Wrapper for James's society plots.
     """
+    @instrumented
     def __init__(self, wellness='./society/london_cv19_wellness.csv', happiness='./society/ons_happiness.csv'):
         self.wellness = pd.read_csv(wellness)
         self.happiness = pd.read_csv(happiness)
@@ -30,7 +38,23 @@ class Society():
 
         return employment
 
-    def plot_domestic_issues(self, figsize=(600, 300), plot_bounds=True, colors=['black', 'darkturquoise']):
+    def simulate_commuting(self, scenario='pre_lockdown', office_days=None, **kwargs):
+        """
+        Weekly commuting CO2 from a microsimulation of the workforce, calibrated to
+        employment_table. `scenario` is one of SCENARIOS ('pre_lockdown', 'lockdown',
+        'four_day_week'); `office_days` overrides its office days a week.
+
+        Returns people (m) by employment status, and commuters, trips, passenger km
+        and CO2 (tonnes) a week by commute mode. Further arguments (agents_per_person,
+        chunk_size, seed, processes, mode_shares, emission_factors, ...) are passed
+        to commuting.simulate.
+        """
+        settings = SCENARIOS[scenario]
+        return simulate(self.employment_table(), settings['column'],
+                        office_days=settings['office_days'] if office_days is None else office_days, **kwargs)
+
+    @instrumented
+    def plot_domestic_issues(self, figsize=(600, 300), plot_bounds=True, colors=['black', 'darkturquoise'], show=True):
         
         df = self.wellness
 
@@ -51,9 +75,13 @@ class Society():
             p.varea(x=df.index.values,y1=df['min'].values,y2=df['max'].values,
                     alpha=0.2, color=colors[1], legend_label='Max/min bounds')
 
-        bkh.show(p)
+        if not show:
+            return p
+        with span('bokeh.show'):
+            bkh.show(p)
 
-    def plot_happiness(self, figsize=(600, 300), colors=['darkgreen','darksalmon','darkred','gold']):
+    @instrumented
+    def plot_happiness(self, figsize=(600, 300), colors=['darkgreen','darksalmon','darkred','gold'], show=True):
         
         df = self.happiness
 
@@ -69,4 +97,7 @@ class Society():
             p.line(x=df.index.values, y=df[s].values, color=colors[0], legend_label=s, line_color=colors[i])
 
         p.legend.location = 'center_right'
-        bkh.show(p)
\ No newline at end of file
+        if not show:
+            return p
+        with span('bokeh.show'):
+            bkh.show(p)
\ No newline at end of file
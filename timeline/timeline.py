@@ -11,11 +11,15 @@ from bokeh.models import DatetimeTickFormatter
 from bokeh.models import HoverTool
 from bokeh.transform import factor_cmap, factor_mark
 
+from instrumentation import instrumented, span
+
 class TimelineData:
+    @instrumented
     def __init__(self, timeline_file):
         self.timeline = pd.read_csv(timeline_file).fillna('')
         self.timeline.Date = pd.to_datetime(self.timeline.Date, format='%d-%b-%y').dt.date
         
+    @instrumented
     def plot_timeline(self, colors= ['darkgrey', 'tomato', 'darkgrey'], transport = [False, True, False]):
         
         output_notebook()
@@ -56,4 +60,5 @@ class TimelineData:
         
         p.yaxis.visible = False
         
-        show(p)
+        with span('bokeh.show'):
+            show(p)
@@ -7,8 +7,20 @@ from statsmodels.graphics.tsaplots import plot_acf
 from scipy import stats
 from math import ceil
 
+try:
+    from .results_store import ResultsStore, FitResult, fit_key
+    from .crossval import rolling_origin_cv
+except ImportError:
+    from results_store import ResultsStore, FitResult, fit_key
+    from crossval import rolling_origin_cv
 
-def run_diagnostics(data, predictions, model, file_name, save=False):
+from calendar_table import calendar
+
+from instrumentation import instrumented, span
+
+
+@instrumented
+def run_diagnostics(data, predictions, student_residuals, file_name, save=False):
     fig, axs = plt.subplots(2, 2, figsize=(12, 10), dpi=80, facecolor='w', edgecolor='k')
 
     residuals = data - predictions
@@ -18,7 +30,8 @@ def run_diagnostics(data, predictions, model, file_name, save=False):
 
     from statsmodels.nonparametric.smoothers_lowess import lowess
 
-    smoothed = lowess(residuals, predictions)
+    with span('lowess'):
+        smoothed = lowess(residuals, predictions)
     axs[1, 0].plot([0, 1], [0, 0], color='k', linestyle=':', alpha=.3)
     axs[1, 0].scatter(predictions, residuals)
     axs[1, 0].plot(smoothed[:, 0], smoothed[:, 1], color='r')
@@ -26,11 +39,11 @@ def run_diagnostics(data, predictions, model, file_name, save=False):
     axs[1, 0].set_xlabel('Fitted Values')
     axs[1, 0].set_title('Residuals vs. Fitted')
 
-    if type(model) != 'MixedLMResults':
-        student_residuals = model.get_influence().resid_studentized_internal
+    if student_residuals is not None:
         sqrt_student_residuals = pd.Series(np.sqrt(np.abs(student_residuals)))
-        sqrt_student_residuals.index = model.resid.index
-        smoothed = lowess(sqrt_student_residuals, predictions)
+        sqrt_student_residuals.index = data.index
+        with span('lowess'):
+            smoothed = lowess(sqrt_student_residuals, predictions)
 
         axs[1, 1].scatter(predictions, sqrt_student_residuals)
         axs[1, 1].plot(smoothed[:, 0], smoothed[:, 1], color='r')
@@ -53,12 +66,30 @@ class Traffic:
     diagnostics_directory = ''
     summary_directory = ''
 
-    def __init__(self, transport_file, weather_file):
+    @instrumented
+    def __init__(self, transport_file, weather_file, results_file=None):
 
         self.import_lockdown_phases()
         self.import_transport_data(transport_file)
         self.import_weather_data(weather_file)
         self.set_output_directories()
+        self.set_results_store(results_file)
+
+    def set_results_store(self, results_file=None):
+
+        # Without a file, fitted models are only kept for the lifetime of this object.
+        self.results_file = results_file
+        self.results_store = ResultsStore(results_file or ':memory:')
+
+    def __getstate__(self):
+        # The database connection can't be pickled; reconnect to the same file on unpickling.
+        state = self.__dict__.copy()
+        del state['results_store']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.set_results_store(self.results_file)
 
     def set_output_directories(self, figures_directory='Transport/Figures/',
                                diagnostics_directory='Transport/Model_diagnostics/',
@@ -84,10 +115,14 @@ class Traffic:
 
     def import_transport_data(self, file_name='UK_transport.csv'):
 
-        self.transport = pd.read_csv(file_name)
+        with span('read_csv'):
+            self.transport = pd.read_csv(file_name)
         self.transport.Date = pd.to_datetime(self.transport.Date, format='%d/%m/%Y')
         self.vehicle_types = self.transport.columns[1:]
-        self.transport["day"] = self.transport.Date.dt.day_name()
+        table = calendar(self.transport.Date.values)
+        rows = table.rows(self.transport.Date.values)
+        self.transport["weekday"] = table.weekday[rows]
+        self.transport["bank_holiday"] = table.bank_holiday[rows]
 
     def import_weather_data(self, file_name='UK_weather.csv'):
 
@@ -97,6 +132,7 @@ class Traffic:
 
         self.transport = self.transport.merge(weather, left_on='Date', right_on='date')
 
+    @instrumented
     def plot_transport_data(self, figsize=(10, 8), save=False):
 
         fig, ax = plt.subplots(figsize=figsize, dpi=80, facecolor='w', edgecolor='k')
@@ -112,6 +148,7 @@ class Traffic:
             fig.savefig(self.figures_directory + 'transport_timeline.png')
         plt.show()
 
+    @instrumented
     def plot_CO2_emissions(self, figsize=(16, 8), save=False):
 
         filled_transport = self.transport.interpolate().fillna(method='bfill').fillna(method='ffill')
@@ -163,16 +200,18 @@ class Traffic:
             fig.savefig(self.figures_directory + 'CO2_emission_timeline.png')
         plt.show()
 
-    def estimate_effects(self, plotting=False, immediate=False, vehicle_types=None, save=False):
-
-        if vehicle_types == None:
-            vehicle_types = self.vehicle_types
+    def build_covariates(self, immediate=False):
+        """
+        Add the interrupted-model covariates to the transport table and return their names.
 
+        Each lockdown phase gets a jump and a drift term. With `immediate` the drift
+        of a phase continues after the next phase starts, otherwise it only counts
+        the days within the phase.
+        """
         self.transport["base_drift"] = (self.transport.Date - self.lockdown_phases.date[0]) / np.timedelta64(1, 'D')
         self.transport["base_drift"] = self.transport["base_drift"].astype(int)
         covariates = ["intercept", "base_drift"]
 
-        n_events = 0
         for i in range(len(self.lockdown_phases.event)):
             phase_date = self.lockdown_phases.date[i]
             phase_name = self.lockdown_phases.event[i]
@@ -191,9 +230,34 @@ class Traffic:
                     phase_duration = ((self.transport.Date > phase_date) & (self.transport.Date <= phase_end)).astype(
                         int)
                 self.transport[phase_name + "_drift"] = time_difference * phase_duration
-                n_events = n_events + 1
                 covariates = np.append(covariates, [phase_name + "_jump", phase_name + "_drift"])
 
+        return covariates
+
+    def build_formula(self, vehicle, covariates):
+        """
+        Model formula for a vehicle type, leaving out covariates that are zero
+        wherever it has data. Returns the formula and the number left out.
+        """
+        missing_entries = 0
+        formula = vehicle + " ~ " + covariates[1]
+        for var in covariates[2:]:
+            n_nonzero_entries = sum(self.transport[var][np.isfinite(self.transport[vehicle])])
+            if n_nonzero_entries > 0:
+                formula = formula + " + " + var
+            else:
+                missing_entries = missing_entries + 1
+
+        return formula, missing_entries
+
+    @instrumented
+    def estimate_effects(self, plotting=False, immediate=False, vehicle_types=None, save=False):
+
+        if vehicle_types == None:
+            vehicle_types = self.vehicle_types
+
+        covariates = self.build_covariates(immediate)
+
         parameters_summary = pd.DataFrame(columns=np.concatenate(([i + '_mean' for i in covariates],
                                                                   [i + '_sd' for i in covariates],
                                                                   [i + '_high' for i in covariates],
@@ -204,38 +268,40 @@ class Traffic:
 
         for i, vehicle in enumerate(vehicle_types):
 
-            missing_entries = 0
-            formula = vehicle + " ~ " + covariates[1]
-            for var in covariates[2:]:
-                n_nonzero_entries = sum(self.transport[var][np.isfinite(self.transport[vehicle])])
-                if n_nonzero_entries > 0:
-                    formula = formula + " + " + var
-                else:
-                    missing_entries = missing_entries + 1
-
-            model = smf.ols(formula, data=self.transport, missing='drop').fit()
+            formula, missing_entries = self.build_formula(vehicle, covariates)
 
             if immediate:
                 effect_name = 'immediate'
             else:
                 effect_name = 'daily'
 
+            # Reuse a stored fit of the same data, formula, phases and effect type.
+            key = fit_key(self.transport, vehicle, formula, self.lockdown_phases, effect_name)
+            result = self.results_store.get(key)
+            if result is None:
+                with span('ols.fit'):
+                    model = smf.ols(formula, data=self.transport, missing='drop').fit()
+                result = FitResult.from_model(model, self.transport, vehicle)
+                self.results_store.put(key, vehicle, effect_name, formula, result)
+
             file_name = self.summary_directory + 'OLS_model_' + effect_name + '_effect_summary_' + vehicle + '.csv'
             if save:
                 with open(file_name, 'w') as f:
-                    f.write(model.summary().as_csv())
+                    f.write(result.summary)
 
             fill_cells = missing_entries * [np.nan]
-            parameters = np.concatenate((model.params, fill_cells, model.bse, fill_cells,
-                                         model.conf_int(alpha=0.05, cols=None)[0], fill_cells,
-                                         model.conf_int(alpha=0.05, cols=None)[1], fill_cells))
+            parameters = np.concatenate((result.params, fill_cells, result.bse, fill_cells,
+                                         result.conf_low, fill_cells,
+                                         result.conf_high, fill_cells))
             parameters = pd.DataFrame(parameters.reshape(1, -1), columns=list(parameters_summary))
             parameters_summary = parameters_summary.append(parameters, ignore_index=True)
 
-            predictions = model.predict(self.transport)[np.isfinite(self.transport[vehicle])]
-            data = self.transport[vehicle][np.isfinite(self.transport[vehicle])]
-            date = self.transport["Date"][np.isfinite(self.transport[vehicle])]
-            run_diagnostics(data, predictions, model, self.diagnostics_directory + vehicle + '_ILM_diagnostics.png')
+            predictions = result.predictions.fitted
+            data = result.predictions.observed
+            date = result.predictions.date
+            if save:
+                run_diagnostics(data, predictions, result.predictions.studentized_residual.values,
+                                self.diagnostics_directory + vehicle + '_ILM_diagnostics.png', save=True)
 
             axes[i].plot(date, data, label="Data")
             axes[i].plot(date, predictions, label="Model")
@@ -257,6 +323,7 @@ class Traffic:
 
         return parameters_summary
 
+    @instrumented
     def run_interrupted_LM(self, vehicle_types=None, figsize=(16, 12), save=False):
 
         immediate_effects_summary = self.estimate_effects(plotting=False, immediate=True, vehicle_types=vehicle_types)
@@ -299,42 +366,44 @@ class Traffic:
             figure.savefig(self.figures_directory + 'interrupted_linear_model_parameters.png')
         plt.show()
 
-    def run_mixed_LM_for_bikes(self,  figsize=(16, 12), save=False):
+    @instrumented
+    def rolling_origin_cv(self, vehicle_types=None, min_train=21, max_horizon=14, block_size=20, max_workers=None):
+        """
+        Out-of-sample forecast errors of the interrupted linear models by horizon,
+        for each vehicle type and both the immediate and daily effect types.
+        """
+        if vehicle_types is None:
+            vehicle_types = self.vehicle_types
 
-        self.transport["base_drift"] = (self.transport.Date - self.lockdown_phases.date[0]) / np.timedelta64(1, 'D')
-        self.transport["base_drift"] = self.transport["base_drift"].astype(int)
+        series = []
+        for effect_name, immediate in [('immediate', True), ('daily', False)]:
+            covariates = self.build_covariates(immediate)
+            X = np.column_stack([np.ones(len(self.transport))]
+                                + [self.transport[var].values for var in covariates[1:]]).astype(float)
+            for vehicle in vehicle_types:
+                y = self.transport[vehicle].values.astype(float)
+                finite = np.isfinite(y)
+                series.append(({'vehicle': vehicle, 'effect': effect_name}, X[finite], y[finite]))
 
-        covariates = ["intercept", "base_drift"]
+        return rolling_origin_cv(series, min_train=min_train, max_horizon=max_horizon,
+                                 block_size=block_size, max_workers=max_workers)
 
-        n_events = 0
-        for i in range(len(self.lockdown_phases.event)):
-            phase_date = self.lockdown_phases.date[i]
-            phase_name = self.lockdown_phases.event[i]
-            if sum(self.transport.Date > phase_date) > 0:
-                self.transport[phase_name + "_jump"] = (self.transport.Date > phase_date).astype(int)
-                time_difference = ((self.transport.Date - phase_date) / np.timedelta64(1, 'D')).astype(int)
-                phase_duration = self.transport[phase_name + "_jump"]
-                self.transport[phase_name + "_drift"] = time_difference * phase_duration
-                n_events = n_events + 1
-                covariates = np.append(covariates, [phase_name + "_jump", phase_name + "_drift"])
+    @instrumented
+    def run_mixed_LM_for_bikes(self,  figsize=(16, 12), save=False):
+
+        covariates = self.build_covariates(immediate=True)
 
         vehicle = "Cycling"
 
         covariates = np.append(covariates, "temperature_excess")
 
-        missing_entries = 0
-        formula = vehicle + " ~ " + covariates[1]
-        for var in covariates[2:]:
-            n_nonzero_entries = sum(self.transport[var][np.isfinite(self.transport[vehicle])])
-            if n_nonzero_entries > 0:
-                formula = formula + " + " + var
-            else:
-                missing_entries = missing_entries + 1
+        formula, missing_entries = self.build_formula(vehicle, covariates)
 
-        model = smf.mixedlm(formula, self.transport, groups=self.transport.day, missing='drop').fit()
+        with span('mixedlm.fit'):
+            model = smf.mixedlm(formula, self.transport, groups=self.transport.weekday, missing='drop').fit()
 
         linear_model = model.predict(self.transport)
-        random_effects = self.transport.day.map(model.random_effects)
+        random_effects = self.transport.weekday.map(model.random_effects)
         random_effects = random_effects.apply(lambda x: x.values[0])
         predictions = linear_model + random_effects
 
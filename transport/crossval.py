@@ -0,0 +1,129 @@
+"""
+Rolling-origin (expanding window) cross-validation of the interrupted linear models.
+
+For every origin t the model is fitted on the first t days of a series and
+forecasts the next `max_horizon` days. Rather than refitting from scratch, each
+origin's least-squares solution comes from a QR factorisation that is updated by
+one row (Givens rotations, O(p^2)) as the origin moves forward. Covariates with
+no support in the training window (e.g. a lockdown phase that hasn't started yet)
+give a zero diagonal in R and are left out of that fold's solve, so forecasts
+across a phase change are honest out-of-sample ones.
+"""
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import solve_triangular
+
+from instrumentation import instrumented, span
+
+
+class IncrementalQR:
+    """
+    Upper-triangular R and Q'y of a least-squares problem, updated a row at a time.
+    """
+    def __init__(self, n_features):
+        self.R = np.zeros((n_features, n_features))
+        self.z = np.zeros(n_features)
+        self.n = 0
+
+    def append(self, x, y):
+        """Rotate the row (x, y) into R and z."""
+        R, z = self.R, self.z
+        x = np.array(x, dtype=np.float64)
+        for j in range(len(x)):
+            if x[j] == 0:
+                continue
+            r = np.hypot(R[j, j], x[j])
+            c, s = R[j, j]/r, x[j]/r
+            R[j, j:], x[j:] = c*R[j, j:] + s*x[j:], c*x[j:] - s*R[j, j:]
+            z[j], y = c*z[j] + s*y, c*y - s*z[j]
+        self.n += 1
+
+    def extend(self, X, Y):
+        for x, y in zip(X, Y):
+            self.append(x, y)
+
+    def solve(self, tol=1e-10):
+        """Coefficients, with those of unidentified (zero-diagonal) columns set to 0."""
+        diagonal = np.abs(np.diag(self.R))
+        active = diagonal > tol*max(diagonal.max(), 1)
+        beta = np.zeros(len(self.z))
+        if not active.any():
+            return beta
+
+        reduced = IncrementalQR(active.sum())
+        reduced.R, reduced.z = self.R[np.ix_(active, active)].copy(), self.z[active].copy()
+        # Rows of dropped columns still constrain the others; rotate them back in.
+        for j in np.flatnonzero(~active):
+            reduced.append(self.R[j, active], self.z[j])
+
+        beta[active] = solve_triangular(reduced.R, reduced.z)
+        return beta
+
+
+def forecast_errors(X, y, start, stop, max_horizon):
+    """
+    Forecast errors (forecast - observed) for origins start..stop-1, by horizon.
+
+    Returns a (stop - start, max_horizon) array, NaN where the horizon runs past
+    the end of the series.
+    """
+    qr = IncrementalQR(X.shape[1])
+    qr.extend(X[:start], y[:start])
+
+    errors = np.full((stop - start, max_horizon), np.nan)
+    for i, origin in enumerate(range(start, stop)):
+        end = min(origin + max_horizon, len(y))
+        errors[i, :end - origin] = X[origin:end] @ qr.solve() - y[origin:end]
+        qr.append(X[origin], y[origin])
+    return errors
+
+
+def _blocks(n, min_train, block_size):
+    return [(start, min(start + block_size, n)) for start in range(min_train, n, block_size)]
+
+
+@instrumented
+def rolling_origin_cv(series, min_train=21, max_horizon=14, block_size=20, max_workers=None, processes=True):
+    """
+    Rolling-origin forecast errors summarised by horizon.
+
+    `series` is a list of (labels, X, y) with `labels` a dict of identifying
+    columns (e.g. vehicle and effect type) and rows in date order. Blocks of
+    `block_size` consecutive origins run as separate tasks on a process pool;
+    each starts from a factorisation of the rows before its first origin and
+    updates it for the rest of the block.
+
+    Returns a DataFrame with the labels, horizon (days ahead), number of folds,
+    MAE, RMSE and bias (mean forecast minus observed).
+    """
+    tasks = [(i, start, stop) for i, (_, X, y) in enumerate(series) for start, stop in _blocks(len(y), min_train, block_size)]
+    arguments = ([series[i][1] for i, _, _ in tasks], [series[i][2] for i, _, _ in tasks],
+                 [start for _, start, _ in tasks], [stop for _, _, stop in tasks], [max_horizon]*len(tasks))
+
+    with span('crossval.folds'):
+        if processes and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                blocks = list(pool.map(forecast_errors, *arguments))
+        else:
+            blocks = list(map(forecast_errors, *arguments))
+
+    rows = []
+    for i, (labels, _, _) in enumerate(series):
+        errors = [block for (j, _, _), block in zip(tasks, blocks) if j == i]
+        if not errors:
+            continue
+        errors = np.concatenate(errors)
+        n = np.isfinite(errors).sum(axis=0)
+        with warnings.catch_warnings():
+            # Horizons past the end of a short series have no folds.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mae = np.nanmean(np.abs(errors), axis=0)
+            rmse = np.sqrt(np.nanmean(errors**2, axis=0))
+            bias = np.nanmean(errors, axis=0)
+        for h in range(max_horizon):
+            rows.append(dict(labels, horizon=h + 1, folds=n[h], mae=mae[h], rmse=rmse[h], bias=bias[h]))
+
+    return pd.DataFrame(rows)
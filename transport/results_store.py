@@ -0,0 +1,134 @@
+"""
+Content-addressed SQLite store for fitted interrupted linear models.
+
+Each fit is keyed by a hash of the data it was fitted on, its formula, the
+lockdown phases and the effect type, so a repeated call with the same inputs
+returns the stored coefficients, statistics and predictions instead of refitting.
+Results from every run stay queryable, e.g. store.coefficients(term='national_lockdown_jump').
+"""
+import os
+import time
+import sqlite3
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fits (
+    key TEXT PRIMARY KEY, vehicle TEXT, effect TEXT, formula TEXT, created TEXT,
+    nobs REAL, rsquared REAL, rsquared_adj REAL, aic REAL, bic REAL, llf REAL,
+    fvalue REAL, f_pvalue REAL, summary TEXT);
+CREATE TABLE IF NOT EXISTS coefficients (
+    key TEXT, position INTEGER, term TEXT, coef REAL, se REAL, ci_low REAL, ci_high REAL, pvalue REAL);
+CREATE TABLE IF NOT EXISTS predictions (
+    key TEXT, row INTEGER, date TEXT, observed REAL, fitted REAL, studentized_residual REAL);
+CREATE INDEX IF NOT EXISTS coefficients_key ON coefficients (key);
+CREATE INDEX IF NOT EXISTS predictions_key ON predictions (key);
+"""
+
+STATISTICS = ['nobs', 'rsquared', 'rsquared_adj', 'aic', 'bic', 'llf', 'fvalue', 'f_pvalue']
+
+
+def fit_key(data, vehicle, formula, lockdown_phases, effect):
+    """Hash of everything a fit depends on."""
+    variables = [v.strip() for v in formula.replace('~', '+').split('+')]
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(data[['Date'] + variables], index=True).values.tobytes())
+    digest.update(pd.util.hash_pandas_object(lockdown_phases, index=False).values.tobytes())
+    digest.update('{}|{}'.format(formula, effect).encode())
+    return digest.hexdigest()
+
+
+class FitResult:
+    """
+    The parts of a statsmodels OLS fit used by Traffic, independent of statsmodels.
+
+    `params`, `bse`, `conf_low`, `conf_high` and `pvalues` are Series indexed by
+    term; `predictions` has the date, observed and fitted values and internally
+    studentized residuals of every row used in the fit.
+    """
+    def __init__(self, params, bse, conf_low, conf_high, pvalues, statistics, predictions, summary):
+        self.params = params
+        self.bse = bse
+        self.conf_low = conf_low
+        self.conf_high = conf_high
+        self.pvalues = pvalues
+        self.statistics = statistics
+        self.predictions = predictions
+        self.summary = summary
+
+    @classmethod
+    def from_model(cls, model, data, vehicle):
+        finite = np.isfinite(data[vehicle])
+        conf_int = model.conf_int(alpha=0.05, cols=None)
+        predictions = pd.DataFrame({'date': data.Date[finite],
+                                    'observed': data[vehicle][finite],
+                                    'fitted': model.predict(data)[finite],
+                                    'studentized_residual': model.get_influence().resid_studentized_internal})
+        statistics = {name: float(getattr(model, name)) for name in STATISTICS}
+        return cls(model.params, model.bse, conf_int[0], conf_int[1], model.pvalues, statistics,
+                   predictions, model.summary().as_csv())
+
+
+class ResultsStore:
+    def __init__(self, database=':memory:'):
+        if database != ':memory:' and os.path.dirname(database):
+            os.makedirs(os.path.dirname(database), exist_ok=True)
+        # Datasets may be loaded on a worker thread and used from the notebook's.
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def put(self, key, vehicle, effect, formula, result):
+        statistics = [result.statistics[name] for name in STATISTICS]
+        coefficients = [(key, i, term, result.params[term], result.bse[term], result.conf_low[term],
+                         result.conf_high[term], result.pvalues[term]) for i, term in enumerate(result.params.index)]
+        predictions = result.predictions
+        rows = zip([key]*len(predictions), predictions.index.tolist(),
+                   predictions.date.dt.strftime('%Y-%m-%d').tolist(), predictions.observed.tolist(),
+                   predictions.fitted.tolist(), predictions.studentized_residual.tolist())
+
+        with self.connection:
+            self.connection.execute('DELETE FROM coefficients WHERE key = ?', (key,))
+            self.connection.execute('DELETE FROM predictions WHERE key = ?', (key,))
+            self.connection.execute('INSERT OR REPLACE INTO fits VALUES (?, ?, ?, ?, ?, {}, ?)'.format(', '.join('?'*len(STATISTICS))),
+                                    [key, vehicle, effect, formula, time.strftime('%Y-%m-%d %H:%M:%S')] + statistics + [result.summary])
+            self.connection.executemany('INSERT INTO coefficients VALUES (?, ?, ?, ?, ?, ?, ?, ?)', coefficients)
+            self.connection.executemany('INSERT INTO predictions VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def get(self, key):
+        """The stored FitResult for a key, or None if it has not been fitted."""
+        fit = self.connection.execute('SELECT {}, summary FROM fits WHERE key = ?'.format(', '.join(STATISTICS)), (key,)).fetchone()
+        if fit is None:
+            return None
+
+        coefficients = pd.read_sql_query('SELECT term, coef, se, ci_low, ci_high, pvalue FROM coefficients '
+                                         'WHERE key = ? ORDER BY position', self.connection, params=(key,), index_col='term')
+        predictions = pd.read_sql_query('SELECT row, date, observed, fitted, studentized_residual FROM predictions '
+                                        'WHERE key = ? ORDER BY row', self.connection, params=(key,), index_col='row')
+        predictions.index.name = None
+        predictions['date'] = pd.to_datetime(predictions.date)
+
+        return FitResult(coefficients.coef, coefficients.se, coefficients.ci_low, coefficients.ci_high,
+                         coefficients.pvalue, dict(zip(STATISTICS, fit[:-1])), predictions, fit[-1])
+
+    def fits(self, vehicle=None, effect=None):
+        """Fit statistics of every stored model, optionally for one vehicle or effect type."""
+        query, params = self._where('SELECT key, vehicle, effect, formula, created, {} FROM fits'.format(', '.join(STATISTICS)),
+                                    vehicle=vehicle, effect=effect)
+        return pd.read_sql_query(query, self.connection, params=params)
+
+    def coefficients(self, vehicle=None, effect=None, term=None):
+        """Coefficients, standard errors and confidence intervals across all stored fits."""
+        query, params = self._where('SELECT fits.vehicle, fits.effect, fits.created, coefficients.term, coefficients.coef, '
+                                    'coefficients.se, coefficients.ci_low, coefficients.ci_high, coefficients.pvalue, '
+                                    'fits.key FROM coefficients JOIN fits ON fits.key = coefficients.key',
+                                    vehicle=vehicle, effect=effect, term=term)
+        return pd.read_sql_query(query, self.connection, params=params)
+
+    @staticmethod
+    def _where(query, **conditions):
+        conditions = {name: value for name, value in conditions.items() if value is not None}
+        if conditions:
+            query += ' WHERE ' + ' AND '.join('{} = ?'.format(name) for name in conditions)
+        return query, list(conditions.values())